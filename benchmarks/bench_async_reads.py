@@ -0,0 +1,165 @@
+"""
+Throughput benchmark of the recipe reads at 500 concurrent clients: the same
+requests against gunicorn's sync workers (config.wsgi) and against uvicorn
+workers running the async views (config.asgi, recipe.async_views), with the
+same number of worker processes.
+
+Every client keeps one HTTP/1.1 connection open (reconnecting when a sync
+worker closes it) and requests the paths in turn for the whole run. The
+anonymous list and detail reads are cache hits after the warm-up; trending
+queries the database every time. Needs a migrated database with recipes,
+`--seed` adds them.
+
+    python benchmarks/bench_async_reads.py [--clients 500] [--duration 20] [--workers 2] [--seed 200]
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+SERVERS = {
+    'wsgi (sync workers)': ['config.wsgi:application'],
+    'asgi (uvicorn workers)': ['config.asgi:application', '--worker-class', 'uvicorn.workers.UvicornWorker'],
+}
+
+
+def seed(count):
+    import django
+    django.setup()
+    from recipe.models import Recipe, RecipeCategory, RecipeTrending
+    from recipe.trending import update_scores
+    from users.models import CustomUser
+
+    author, _ = CustomUser.objects.get_or_create(email='bench@example.com', defaults={'username': 'bench'})
+    category, _ = RecipeCategory.objects.get_or_create(name='Bench')
+    Recipe.objects.bulk_create([
+        Recipe(author=author, category=category, title=f'Bench recipe {i}', desc='A short description',
+               cook_time='00:45:00', ingredients='egg, flour, milk', procedure='Mix and bake. ' * 20,
+               like_count=i % 50, bookmark_count=i % 7)
+        for i in range(count)
+    ])
+    update_scores()
+    print(f'seeded {count} recipes, {RecipeTrending.objects.count()} trending')
+
+
+def recipe_paths():
+    import django
+    django.setup()
+    from recipe.models import Recipe
+    pk = Recipe.objects.order_by('-pk').values_list('pk', flat=True).first()
+    if pk is None:
+        sys.exit('No recipes to read, run with --seed')
+    return ['/api/recipe/', f'/api/recipe/{pk}/', '/api/recipe/trending/']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, port, workers):
+    command = [sys.executable, '-m', 'gunicorn', *args, '--bind', f'127.0.0.1:{port}',
+               '--workers', str(workers), '--backlog', '2048', '--log-level', 'warning']
+    server = subprocess.Popen(command, cwd=ROOT)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    sys.exit(f'{" ".join(command)} did not start')
+
+
+async def request(port, path, connection):
+    if connection is None:
+        connection = await asyncio.open_connection('127.0.0.1', port)
+    reader, writer = connection
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\nAccept: application/json\r\n\r\n'.encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    length, keep_alive = 0, True
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+        elif name.lower() == 'connection' and value.strip().lower() == 'close':
+            keep_alive = False
+    await reader.readexactly(length)
+    if not keep_alive:
+        writer.close()
+        connection = None
+    return int(status_line.split()[1]), connection
+
+
+async def client(port, paths, deadline, latencies, errors):
+    connection, turn = None, 0
+    while time.monotonic() < deadline:
+        path = paths[turn % len(paths)]
+        turn += 1
+        started = time.monotonic()
+        try:
+            status, connection = await asyncio.wait_for(request(port, path, connection), 30)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError):
+            errors.append(path)
+            connection = None
+            continue
+        if status == 200:
+            latencies.append(time.monotonic() - started)
+        else:
+            errors.append(path)
+    if connection is not None:
+        connection[1].close()
+
+
+async def load(port, paths, clients, duration):
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*[client(port, paths, deadline, latencies, errors) for _ in range(clients)])
+    return latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    options = parser.parse_args()
+    if options.seed:
+        seed(options.seed)
+    paths = recipe_paths()
+
+    for name, args in SERVERS.items():
+        port = free_port()
+        server = start_server(args, port, options.workers)
+        try:
+            # Fills the caches of every worker
+            asyncio.run(load(port, paths, 20, 2))
+            latencies, errors = asyncio.run(load(port, paths, options.clients, options.duration))
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0
+        print(f'{name:24} {len(latencies) / options.duration:8.0f} req/s   '
+              f'p50 {p50:7.1f} ms   p99 {p99:7.1f} ms   errors {len(errors)}')
+
+
+if __name__ == '__main__':
+    main()
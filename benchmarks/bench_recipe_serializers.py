@@ -0,0 +1,73 @@
+"""
+Micro-benchmark of recipe list serialization: `RecipeSerializer` against the
+compiled `RecipeRowSerializer`, on in-memory rows so only CPU time is measured.
+
+    python benchmarks/bench_recipe_serializers.py
+"""
+import os
+import sys
+import timeit
+from collections import namedtuple
+from datetime import datetime, time, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.request import Request  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from recipe.models import Recipe, RecipeCategory  # noqa: E402
+from recipe.serializers import RecipeRowSerializer, RecipeSerializer  # noqa: E402
+from users.models import CustomUser  # noqa: E402
+
+
+def build_recipes(count):
+    author = CustomUser(id=1, username='author', email='author@example.com')
+    category = RecipeCategory(id=1, name='Dinner')
+    now = datetime.now(timezone.utc)
+    return [
+        Recipe(id=i, author=author, category=category, picture=f'uploads/{i}.jpg',
+               title=f'Recipe {i}', desc='A short description', cook_time=time(0, 45),
+               ingredients='egg, flour, milk, butter' * 5, procedure='Mix and bake. ' * 50,
+               created_at=now, updated_at=now, like_count=i % 100, bookmark_count=i % 10)
+        for i in range(1, count + 1)
+    ]
+
+
+def build_rows(serializer, recipes):
+    Row = namedtuple('Row', [column.replace('__', '_') for column in serializer.columns])
+
+    def value(recipe, column):
+        if '__' in column:
+            relation, field = column.split('__')
+            return getattr(getattr(recipe, relation), field)
+        return getattr(recipe, column)
+
+    return [Row(*[value(recipe, column) for column in serializer.columns]) for recipe in recipes]
+
+
+def main():
+    request = Request(APIRequestFactory().get('/api/recipe/'))
+    for count in (1000, 10000):
+        recipes = build_recipes(count)
+        serializer = RecipeRowSerializer(RecipeSerializer.Meta.fields, request=request)
+        rows = build_rows(serializer, recipes)
+        assert serializer.to_representation(rows[:10]) == \
+            RecipeSerializer(recipes[:10], many=True, context={'request': request}).data
+
+        repeat = 5
+        drf = min(timeit.repeat(
+            lambda: RecipeSerializer(recipes, many=True, context={'request': request}).data,
+            number=1, repeat=repeat))
+        fast = min(timeit.repeat(lambda: serializer.to_representation(rows), number=1, repeat=repeat))
+        print(f'{count:>6} rows  RecipeSerializer {drf * 1000:8.1f} ms  '
+              f'RecipeRowSerializer {fast * 1000:8.1f} ms  speedup {drf / fast:5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Memory benchmark of image upload handling: a 50 MB JPEG is parsed from a
+multipart body and its `picture` field validated, once with Django's default
+upload handlers and DRF's `ImageField`, once with the capped streaming
+handlers and `HeaderValidatedImageField` (recipe.uploads), and once with the
+default 10 MB cap. The decode done by the renditions task is measured too,
+in full and with the `draft` it uses. Every variant runs in a fresh process
+and reports how much its peak RSS grew.
+
+    python benchmarks/bench_upload_memory.py
+"""
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+BOUNDARY = 'BenchBoundary'
+TARGET_SIZE = 50 * 1024 * 1024
+DEFAULT_HANDLERS = [
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+
+def build_body(path, jpeg_path):
+    """
+    Writes a noise JPEG of about TARGET_SIZE bytes and a multipart body
+    holding it.
+    """
+    from PIL import Image
+    # Noise JPEGs at quality 100 take about 3.9 bytes per pixel
+    width = height = int((TARGET_SIZE / 3.9) ** 0.5)
+    image = Image.frombytes('RGB', (width, height), os.urandom(width * height * 3))
+    image.save(jpeg_path, 'JPEG', quality=100, subsampling=0)
+    with open(path, 'wb') as body, open(jpeg_path, 'rb') as jpeg:
+        body.write(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="picture"; '
+                   f'filename="big.jpg"\r\nContent-Type: image/jpeg\r\n\r\n'.encode())
+        shutil.copyfileobj(jpeg, body)
+        body.write(f'\r\n--{BOUNDARY}--\r\n'.encode())
+    return os.path.getsize(path)
+
+
+def proc_status(field):
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field):
+                return int(line.split()[1])
+
+
+def start_peak():
+    """
+    Resets the peak RSS where Linux allows it and returns the baseline in KB.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return proc_status('VmRSS')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def peak_rss():
+    try:
+        return proc_status('VmHWM')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure_decode(variant, path):
+    from PIL import Image
+    from recipe.renditions import RENDITION_WIDTHS
+
+    with open(path, 'rb') as jpeg:
+        before = start_peak()
+        image = Image.open(jpeg)
+        if variant == 'draft':
+            width = max(RENDITION_WIDTHS.values())
+            image.draft('RGB', (width, image.height * width // image.width))
+        image.load()
+    print(f'{variant:>10}  peak RSS +{(peak_rss() - before) / 1024:7.1f} MB  decoded at {image.size}')
+
+
+def measure(variant, path):
+    import django
+    django.setup()
+    if variant in ('decode', 'draft'):
+        return measure_decode(variant, path)
+    from django.conf import settings
+    from django.core.handlers.wsgi import WSGIRequest
+    from rest_framework import serializers
+    from rest_framework.exceptions import APIException
+    from rest_framework.parsers import MultiPartParser
+    from rest_framework.request import Request
+
+    from recipe.uploads import HeaderValidatedImageField
+
+    if variant == 'default':
+        settings.FILE_UPLOAD_HANDLERS = DEFAULT_HANDLERS
+        field = serializers.ImageField()
+    else:
+        field = HeaderValidatedImageField()
+        if variant == 'streaming':
+            settings.MAX_UPLOAD_SIZE = 64 * 1024 * 1024
+
+    with open(path, 'rb') as body:
+        request = Request(WSGIRequest({
+            'REQUEST_METHOD': 'POST', 'PATH_INFO': '/api/recipe/', 'SERVER_NAME': 'bench', 'SERVER_PORT': '80',
+            'wsgi.input': body, 'CONTENT_LENGTH': str(os.path.getsize(path)),
+            'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+        }), parsers=[MultiPartParser()])
+        before = start_peak()
+        try:
+            field.run_validation(request.FILES['picture'])
+            outcome = 'valid'
+        except APIException as e:
+            outcome = f'rejected ({e.status_code}) after {body.tell() // (1024 * 1024)} MB read'
+    print(f'{variant:>10}  peak RSS +{(peak_rss() - before) / 1024:7.1f} MB  {outcome}')
+
+
+def main():
+    if len(sys.argv) == 3:
+        return measure(sys.argv[1], sys.argv[2])
+    with tempfile.TemporaryDirectory() as directory:
+        path, jpeg_path = os.path.join(directory, 'body'), os.path.join(directory, 'big.jpg')
+        print(f'multipart body: {build_body(path, jpeg_path) / (1024 * 1024):.1f} MB')
+        # `capped` keeps the default MAX_UPLOAD_SIZE and is turned away
+        for variant in ('default', 'streaming', 'capped'):
+            subprocess.run([sys.executable, __file__, variant, path], check=True)
+        for variant in ('decode', 'draft'):
+            subprocess.run([sys.executable, __file__, variant, jpeg_path], check=True)
+
+
+if __name__ == '__main__':
+    main()
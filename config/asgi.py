@@ -9,8 +9,24 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+
+class AsyncURLConfHandler(ASGIHandler):
+    """
+    Resolves requests with config.asgi_urls, which mounts the async recipe
+    reads and logins. Only this entry point serves them.
+    """
+    urlconf = 'config.asgi_urls'
+
+    async def get_response_async(self, request):
+        request.urlconf = self.urlconf
+        return await super().get_response_async(request)
+
+
+# What get_asgi_application() does, with the handler above
+django.setup(set_prefix=False)
+application = AsyncURLConfHandler()
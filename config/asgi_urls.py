@@ -0,0 +1,20 @@
+from django.urls import include, path
+
+from recipe import urls as recipe_urls
+from users import urls as users_urls
+from .urls import urlpatterns as wsgi_urlpatterns
+
+# URLs of config.asgi: config.urls with the async recipe reads and logins
+# mounted in place of the sync views. WSGI keeps the plain views, which
+# would otherwise pay an event loop and a thread hop per request.
+ASYNC_URLPATTERNS = {
+    'recipe': recipe_urls.async_urlpatterns,
+    'users': users_urls.async_urlpatterns,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), include((ASYNC_URLPATTERNS[pattern.namespace], pattern.app_name),
+                                       namespace=pattern.namespace))
+    if getattr(pattern, 'namespace', None) in ASYNC_URLPATTERNS else pattern
+    for pattern in wsgi_urlpatterns
+]
@@ -0,0 +1,83 @@
+import asyncio
+
+from corsheaders.middleware import CorsMiddleware as BaseCorsMiddleware
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware as BaseAuthenticationMiddleware
+from django.middleware.clickjacking import XFrameOptionsMiddleware as BaseXFrameOptionsMiddleware
+from django.middleware.common import CommonMiddleware as BaseCommonMiddleware
+from django.middleware.csrf import CsrfViewMiddleware as BaseCsrfViewMiddleware
+from django.middleware.security import SecurityMiddleware as BaseSecurityMiddleware
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+# Under ASGI, Django 3.2 runs every sync middleware hook on its single sync
+# thread, one thread switch per hook and request, which async views
+# (recipe.async_views) then wait for. The request and response hooks of the
+# middleware below only read and set headers, so they run on the event loop
+# instead. Session and message middleware may write to the database and
+# keep Django's handling, as do the (sync) process_view hooks.
+
+
+class EventLoopHooksMixin:
+    """
+    Runs the `process_*` hooks of a MiddlewareMixin subclass inline when the
+    middleware is called async. Only for hooks that never block.
+    """
+    async def __acall__(self, request):
+        response = None
+        if hasattr(self, 'process_request'):
+            response = self.process_request(request)
+        response = response or await self.get_response(request)
+        if hasattr(self, 'process_response'):
+            response = self.process_response(request, response)
+        return response
+
+
+class CorsMiddleware(EventLoopHooksMixin, BaseCorsMiddleware):
+    pass
+
+
+class SecurityMiddleware(EventLoopHooksMixin, BaseSecurityMiddleware):
+    pass
+
+
+class CommonMiddleware(EventLoopHooksMixin, BaseCommonMiddleware):
+    pass
+
+
+class CsrfViewMiddleware(EventLoopHooksMixin, BaseCsrfViewMiddleware):
+    pass
+
+
+class AuthenticationMiddleware(EventLoopHooksMixin, BaseAuthenticationMiddleware):
+    pass
+
+
+class XFrameOptionsMiddleware(EventLoopHooksMixin, BaseXFrameOptionsMiddleware):
+    pass
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """
+    WhiteNoise middleware that can also run async; the stock one is sync
+    only, which makes Django run the whole ASGI request, async views
+    included, on its sync thread. Static files are matched in memory.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if asyncio.iscoroutinefunction(get_response):
+            # Marks the instance as a coroutine function, like Django's MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        response = self.process_request(request)
+        if response is None:
+            response = await self.get_response(request)
+        return response
@@ -38,16 +38,17 @@ INSTALLED_APPS = [
     'recipe',
 ]
 
+# Async capable versions of the stock middleware, see config.middleware
 MIDDLEWARE = [
-    'corsheaders.middleware.CorsMiddleware',
-    'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'config.middleware.CorsMiddleware',
+    'config.middleware.SecurityMiddleware',
+    'config.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'config.middleware.CommonMiddleware',
+    'config.middleware.CsrfViewMiddleware',
+    'config.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'config.middleware.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -129,6 +130,10 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.CustomUser'
 
+# ModelBackend, also checking passwords on the hashing pool for async
+# logins (users.backends)
+AUTHENTICATION_BACKENDS = ['users.backends.HashingPoolBackend']
+
 CORS_ORIGIN_ALLOW_ALL = True
 
 
@@ -139,17 +144,24 @@ EMAIL_USE_TLS = True
 EMAIL_PORT = 587
 EMAIL_HOST_USER = config('EMAIL_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_PASSWORD')
+# Batched delivery (recipe.tasks.send_email_batch): messages per second
+# each batch sends over its connection (0 for no limit), the only rate limit
+# of the task, and the base retry delay in seconds
+EMAIL_BATCH_RATE_PER_SECOND = 5
+EMAIL_RETRY_BACKOFF = 60
 
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # DRF's, with 413s for oversized uploads
+    'EXCEPTION_HANDLER': 'recipe.uploads.exception_handler',
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10
 }
@@ -191,6 +203,66 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Cache config
+# Redis when CACHE_URL is set (production), local memory otherwise (tests)
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Media files are named by content hash and shared between identical
+# uploads, see recipe.storage
+DEFAULT_FILE_STORAGE = 'recipe.storage.ContentAddressedStorage'
+
+# Uploads are streamed to temporary files, never held in memory, and
+# capped per file (recipe.uploads.MaxUploadSizeHandler)
+FILE_UPLOAD_HANDLERS = [
+    'recipe.uploads.MaxUploadSizeHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+MAX_UPLOAD_SIZE = config('MAX_UPLOAD_SIZE', default=10 * 1024 * 1024, cast=int)
+
+# Threads the async recipe reads (recipe.async_views) run the viewset on
+# under ASGI, each with its own database connection. 0 runs it on Django's
+# sync thread instead, as tests do to share the test transaction.
+RECIPE_READ_WORKERS = config('RECIPE_READ_WORKERS', default=16, cast=int)
+
+# Lifetime of cached recipe list and detail responses, in seconds
+RECIPE_CACHE_TIMEOUT = 300
+
+# Under ASGI (config.asgi), login and registration hash passwords on a
+# bounded thread pool (users.hashing): hashing threads, and calls allowed
+# to wait for one before further sign-ins get a 503. WSGI workers hash
+# inline, so there a login storm still holds workers.
+PASSWORD_HASHING_WORKERS = config('PASSWORD_HASHING_WORKERS', default=4, cast=int)
+PASSWORD_HASHING_QUEUE = config('PASSWORD_HASHING_QUEUE', default=32, cast=int)
+
+# Lifetime of the users (with profiles) cached by JWT authentication, in
+# seconds; saves drop them earlier (users.authentication)
+AUTH_USER_CACHE_TIMEOUT = 60
+
+# Write-behind likes: like/unlike intents are buffered in the Redis of
+# LIKE_BUFFER_URL, which write-behind requires, and written by
+# recipe.tasks.flush_like_buffer. "memory://" buffers in process (tests only)
+LIKE_WRITE_BEHIND = config('LIKE_WRITE_BEHIND', default=False, cast=bool)
+LIKE_BUFFER_URL = config('LIKE_BUFFER_URL', default='')
+
+# Bloom filter in front of the refresh token blacklist (users.blacklist),
+# in the Redis of BLACKLIST_FILTER_URL, which the filter requires.
+# "memory://" keeps it in process (tests only)
+BLACKLIST_FILTER = config('BLACKLIST_FILTER', default=False, cast=bool)
+BLACKLIST_FILTER_URL = config('BLACKLIST_FILTER_URL', default='')
+
 # Password reset token lifetime
 DJANGO_REST_MULTITOKENAUTH_RESET_TOKEN_EXPIRY_TIME = 3  # in hours
 
@@ -0,0 +1,67 @@
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from rest_framework.generics import GenericAPIView
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+
+def render_response(data, status_code=200, headers=None):
+    """
+    DRF response rendered as JSON outside of an API view.
+    """
+    response = Response(data, status=status_code, headers=headers)
+    response.accepted_renderer = JSONRenderer()
+    response.accepted_media_type = 'application/json'
+    response.renderer_context = {}
+    return response.render()
+
+
+class AsyncGenericAPIView(GenericAPIView):
+    """
+    GenericAPIView whose handlers may be coroutines, for endpoints that await
+    work done off the event loop under ASGI. DRF 3.12 and Django 3.2 have no
+    async class-based views.
+
+    Parsing, authentication, permissions, throttling, exception handling and
+    the schema stay DRF's. The checks of `initial()` and sync handlers run on
+    Django's sync thread, like in any other view.
+    """
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+
+        # Keeps `cls`, `initkwargs` and `csrf_exempt` of the DRF view
+        return functools.update_wrapper(async_view, view)
+
+    async def dispatch(self, request, *args, **kwargs):
+        # APIView.dispatch, awaiting the checks and the handler
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(),
+                                  self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if asyncio.iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
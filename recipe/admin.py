@@ -1,7 +1,10 @@
 from django.contrib import admin
-from .models import RecipeCategory, Recipe, RecipeLike
+from .models import RecipeCategory, Recipe, RecipeLike, RecipeIngredient, RecipeTrending, MediaBlob
 
 # Register your models here.
 admin.site.register(RecipeCategory)
 admin.site.register(Recipe)
 admin.site.register(RecipeLike)
+admin.site.register(RecipeIngredient)
+admin.site.register(RecipeTrending)
+admin.site.register(MediaBlob)
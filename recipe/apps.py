@@ -1,31 +1,61 @@
 from django.apps import AppConfig
 from django.db.models.signals import post_migrate
 
-# This adds a task to send daily notifications based on likes on recipes
-def setup_periodic_tasks(sender, **kwargs):
+# Creates or updates a periodic task running `task` on a daily crontab
+def register_daily_task(task_name, task, hour, minute='0'):
     from django_celery_beat.models import PeriodicTask, CrontabSchedule
     schedule, _ = CrontabSchedule.objects.get_or_create(
-        minute='0',
-        hour='8',
-        day_of_week='*',  
-        day_of_month='*',  
+        minute=minute,
+        hour=hour,
+        day_of_week='*',
+        day_of_month='*',
         month_of_year='*',
         timezone='Asia/Kolkata'
     )
 
-    task_name = 'Send daily notifications'
-    task, created = PeriodicTask.objects.get_or_create(
+    periodic_task, created = PeriodicTask.objects.get_or_create(
         name=task_name,
         defaults={
             'crontab': schedule,
-            'task': 'recipe.tasks.send_daily_notifications',
+            'task': task,
         }
     )
 
     if not created:
-        task.crontab = schedule
-        task.task = 'recipe.tasks.send_daily_notifications'
-        task.save()
+        periodic_task.crontab = schedule
+        periodic_task.task = task
+        periodic_task.save()
+
+# Creates or updates a periodic task running `task` every `seconds`
+def register_interval_task(task_name, task, seconds):
+    from django_celery_beat.models import PeriodicTask, IntervalSchedule
+    schedule, _ = IntervalSchedule.objects.get_or_create(
+        every=seconds,
+        period=IntervalSchedule.SECONDS,
+    )
+
+    PeriodicTask.objects.update_or_create(
+        name=task_name,
+        defaults={
+            'interval': schedule,
+            'crontab': None,
+            'task': task,
+        }
+    )
+
+# This adds a task to send daily notifications based on likes on recipes
+# and a nightly job that fixes drifted like and bookmark counters, plus the
+# flush of buffered likes, the trending scores update, the hourly pruning
+# of expired refresh tokens, the build of a missing token blacklist filter
+# and a nightly sweep of orphaned media files
+def setup_periodic_tasks(sender, **kwargs):
+    register_daily_task('Send daily notifications', 'recipe.tasks.send_daily_notifications', hour='8')
+    register_daily_task('Reconcile recipe counters', 'recipe.tasks.reconcile_recipe_counters', hour='3')
+    register_daily_task('Sweep orphaned media', 'recipe.tasks.sweep_orphaned_media', hour='4')
+    register_interval_task('Flush buffered likes', 'recipe.tasks.flush_like_buffer', seconds=5)
+    register_interval_task('Update trending scores', 'recipe.tasks.update_trending_scores', seconds=60)
+    register_interval_task('Prune token blacklist', 'recipe.tasks.prune_token_blacklist', seconds=3600)
+    register_interval_task('Build token blacklist filter', 'recipe.tasks.build_token_blacklist_filter', seconds=60)
 
 
 class RecipeConfig(AppConfig):
@@ -33,4 +63,5 @@ class RecipeConfig(AppConfig):
     name = 'recipe'
 
     def ready(self):
+        import recipe.signals  # noqa
         post_migrate.connect(setup_periodic_tasks, sender=self)
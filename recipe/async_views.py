@@ -0,0 +1,120 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import URLPattern
+from django.utils.cache import patch_vary_headers
+from rest_framework.permissions import SAFE_METHODS
+
+from config.views import render_response
+from .conditional import not_modified, set_validators
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_read_executor():
+    """
+    Returns the process-wide pool of `RECIPE_READ_WORKERS` threads the
+    viewset runs on, or None when it is 0 (tests), which keeps the viewset on
+    Django's own sync thread and database connection.
+    """
+    global _executor
+    if not settings.RECIPE_READ_WORKERS:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.RECIPE_READ_WORKERS, thread_name_prefix='recipe-reads')
+        return _executor
+
+
+def call_view(view, request, *args, **kwargs):
+    # Rendered here, so the event loop only gets a finished response
+    response = view(request, *args, **kwargs)
+    if callable(getattr(response, 'render', None)):
+        response.render()
+    return response
+
+
+def call_view_on_pool(view, request, *args, **kwargs):
+    # Pool threads keep their own connections, closed like at the end of a
+    # request once they are past CONN_MAX_AGE or unusable
+    close_old_connections()
+    try:
+        return call_view(view, request, *args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_view(view, request, *args, **kwargs):
+    # Only reads go to the read pool, writes run on Django's sync thread
+    executor = get_read_executor()
+    if executor is None or request.method not in SAFE_METHODS:
+        return await sync_to_async(call_view, thread_sensitive=True)(view, request, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, functools.partial(call_view_on_pool, view, request, *args, **kwargs))
+
+
+def shares_cached_response(request, kwargs):
+    """
+    True for the requests answered with the shared cached entry as it is:
+    anonymous (no credentials to check, no viewer flags to add) and for JSON.
+    """
+    return (
+        request.method == 'GET'
+        and 'HTTP_AUTHORIZATION' not in request.META
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        # Credentials forced by DRF's test client
+        and getattr(request, '_force_auth_user', None) is None
+        and 'format' not in kwargs and 'format' not in request.GET
+        and 'text/html' not in request.META.get('HTTP_ACCEPT', '')
+    )
+
+
+def async_view(view, lookup=None):
+    """
+    Async front of a router view of RecipeViewSet. Cache hits of anonymous
+    GETs are answered on the event loop through `lookup(request, **kwargs)`;
+    other reads (misses, authenticated viewers) run the viewset on the read
+    pool, so slow queries never block the loop, and writes on Django's sync
+    thread.
+    """
+    # Allow header of the viewset, which answers HEAD like GET
+    methods = {*view.actions, 'options', *(['head'] if 'get' in view.actions else [])}
+    allowed = ', '.join(method.upper() for method in view.cls.http_method_names if method in methods)
+
+    async def wrapped(request, *args, **kwargs):
+        if lookup is not None and shares_cached_response(request, kwargs):
+            entry = await lookup(request, **kwargs)
+            if entry is not None:
+                # Same response as RecipeViewSet.cached_response gives anonymous viewers
+                validators = entry['validators']
+                response = not_modified(request, validators)
+                if response is None:
+                    response = render_response(entry['data'])
+                response['Allow'] = allowed
+                patch_vary_headers(response, ('Authorization', 'Cookie', 'Accept'))
+                return set_validators(response, validators)
+        return await run_view(view, request, *args, **kwargs)
+
+    # DRF views are exempt and check CSRF themselves; the csrf_exempt
+    # decorator of Django 3.2 does not support async views
+    wrapped.csrf_exempt = True
+    wrapped.cls, wrapped.actions, wrapped.initkwargs = view.cls, view.actions, view.initkwargs
+    return wrapped
+
+
+def async_urls(urlpatterns, lookups):
+    """
+    Replaces the views of the router URLs named in `lookups` (format suffix
+    variants included) with their async fronts.
+    """
+    return [
+        URLPattern(pattern.pattern, async_view(pattern.callback, lookups[pattern.name]), pattern.default_args, pattern.name)
+        if isinstance(pattern, URLPattern) and pattern.name in lookups else pattern
+        for pattern in urlpatterns
+    ]
@@ -0,0 +1,115 @@
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .cache import invalidate_feed, invalidate_recipes
+from .models import Recipe, RecipeCategory, RecipeIngredient
+from .search import get_search_backend
+from .serializers import BulkRecipeSerializer
+
+# Largest number of items accepted in one bulk request
+MAX_BULK_ITEMS = 5000
+# Rows per INSERT / UPDATE statement
+BULK_BATCH_SIZE = 500
+
+
+def resolve_categories(names):
+    """
+    Maps category names to categories with one query, creating the missing
+    ones with one bulk insert.
+    """
+    categories = {}
+    for category in RecipeCategory.objects.filter(name__in=names).order_by('-pk'):
+        categories[category.name] = category
+    missing = [RecipeCategory(name=name) for name in names if name not in categories]
+    if missing:
+        RecipeCategory.objects.bulk_create(missing)
+        if not connection.features.can_return_rows_from_bulk_insert:
+            missing = RecipeCategory.objects.filter(name__in=[c.name for c in missing])
+        categories.update((category.name, category) for category in missing)
+    return categories
+
+
+def save_recipes(items, author, context):
+    """
+    Validates a list of recipe payloads together and writes the valid ones
+    with batched inserts and updates. Invalid items are reported by index and
+    never block the valid ones.
+
+    Returns one result per item, `{'index', 'id', 'status'}` on success or
+    `{'index', 'errors'}` on failure.
+    """
+    create_serializer = BulkRecipeSerializer(context=context)
+    update_serializer = BulkRecipeSerializer(context=context, partial=True)
+
+    results = [None] * len(items)
+    to_create, to_update = [], []
+    for index, item in enumerate(items):
+        is_update = isinstance(item, dict) and item.get('id') is not None
+        serializer = update_serializer if is_update else create_serializer
+        try:
+            data = serializer.run_validation(item)
+        except ValidationError as e:
+            results[index] = {'index': index, 'errors': e.detail}
+            continue
+        if 'name' not in data.get('category', {'name': None}):
+            # Partial updates may send a category without a name
+            del data['category']
+        (to_update if is_update else to_create).append((index, data))
+
+    # Updated recipes are loaded with one query, restricted to the author's
+    existing = Recipe.objects.filter(author=author, pk__in=[data['id'] for index, data in to_update])
+    existing = existing.in_bulk()
+    for index, data in to_update:
+        if data['id'] not in existing:
+            results[index] = {'index': index, 'errors': {'id': ['Recipe not found.']}}
+    to_update = [(index, data) for index, data in to_update if data['id'] in existing]
+
+    names = {data['category']['name'] for index, data in to_create + to_update if 'category' in data}
+    now = timezone.now()
+    with transaction.atomic():
+        categories = resolve_categories(names)
+
+        created = []
+        for index, data in to_create:
+            category = categories[data.pop('category')['name']]
+            created.append(Recipe(**data, author=author, category=category))
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(created, batch_size=BULK_BATCH_SIZE)
+            inserted = created
+        else:
+            # Backends that cannot return ids from a bulk insert (SQLite)
+            # insert row by row, the post_save signals index those rows
+            for recipe in created:
+                recipe.save(force_insert=True)
+            inserted = []
+
+        updated, fields = [], {'updated_at'}
+        for index, data in to_update:
+            recipe = existing[data.pop('id')]
+            if 'category' in data:
+                recipe.category = categories[data.pop('category')['name']]
+                fields.add('category')
+            for name, value in data.items():
+                setattr(recipe, name, value)
+                fields.add(name)
+            recipe.updated_at = now
+            updated.append(recipe)
+        if updated:
+            Recipe.objects.bulk_update(updated, sorted(fields), batch_size=BULK_BATCH_SIZE)
+
+        # bulk_create and bulk_update skip the post_save indexing signals
+        changed = inserted + updated
+        RecipeIngredient.index_recipes((recipe.pk, recipe.ingredients) for recipe in changed)
+        get_search_backend().update_many(changed)
+
+    if updated:
+        invalidate_recipes([recipe.pk for recipe in updated])
+    elif inserted:
+        invalidate_feed()
+
+    for (index, data), recipe in zip(to_create, created):
+        results[index] = {'index': index, 'id': recipe.pk, 'status': 'created'}
+    for (index, data), recipe in zip(to_update, updated):
+        results[index] = {'index': index, 'id': recipe.pk, 'status': 'updated'}
+    return results
@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import time
+import weakref
+
+from django.conf import settings
+from django.core.cache import cache
+
+FEED_GENERATION_KEY = 'recipe:feed:generation'
+VERSION_KEY = 'recipe:{pk}:version'
+DETAIL_KEY = 'recipe:detail:{pk}:v{version}:{digest}'
+LIST_KEY = 'recipe:list:g{generation}:{digest}'
+HITS_KEY = 'recipe:cache:hits'
+MISSES_KEY = 'recipe:cache:misses'
+
+
+def _get_counter(key):
+    """
+    Reads a version counter. A missing counter (never set or evicted) starts
+    from the current time, so entries of an evicted version are never reused.
+    """
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, time.time_ns(), None)
+        value = cache.get(key)
+    return value
+
+
+def _bump_counter(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def _record(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def _digest(request):
+    return hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+
+
+def recipe_pk(value):
+    """
+    The recipe id a URL kwarg names, or None if it names none. Keys use it
+    rather than the kwarg, so `/07/` reads the versions of recipe 7.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def detail_key(request, pk):
+    # Picture URLs are absolute and `?fields=` changes the body, so the full
+    # URI is part of the key. `pk` is a recipe id, see recipe_pk().
+    version = _get_counter(VERSION_KEY.format(pk=pk))
+    return DETAIL_KEY.format(pk=pk, version=version, digest=_digest(request))
+
+
+def list_key(request):
+    # Pagination links are absolute, so the host is part of the key
+    return LIST_KEY.format(generation=_get_counter(FEED_GENERATION_KEY), digest=_digest(request))
+
+
+def lookup(key):
+    """
+    Returns cached response data or None, counting the hit or miss.
+    """
+    data = cache.get(key)
+    _record(MISSES_KEY if data is None else HITS_KEY)
+    return data
+
+
+# Async reads for the ASGI views (recipe.async_views). With Redis they use
+# redis.asyncio, one client per event loop, and django-redis' own key and
+# value encoding; the local-memory cache involves no I/O and is read in place.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _async_client():
+    if not settings.CACHE_URL:
+        return None
+    import redis.asyncio
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = redis.asyncio.Redis.from_url(settings.CACHE_URL)
+    return client
+
+
+async def _aget(key):
+    client = _async_client()
+    if client is None:
+        return cache.get(key)
+    value = await client.get(cache.client.make_key(key))
+    return None if value is None else cache.client.decode(value)
+
+
+async def _arecord(key):
+    client = _async_client()
+    if client is None:
+        _record(key)
+    else:
+        await client.incr(cache.client.make_key(key))
+
+
+async def _alookup(counter_key, make_key):
+    """
+    Returns the cached response data or None. Only hits are counted, a miss
+    is looked up (and counted) again by the sync view that fills the entry.
+    """
+    counter = await _aget(counter_key)
+    if counter is None:
+        return None
+    data = await _aget(make_key(counter))
+    if data is not None:
+        await _arecord(HITS_KEY)
+    return data
+
+
+async def alookup_detail(request, pk):
+    pk = recipe_pk(pk)
+    if pk is None:
+        return None
+    digest = _digest(request)
+    return await _alookup(
+        VERSION_KEY.format(pk=pk), lambda version: DETAIL_KEY.format(pk=pk, version=version, digest=digest))
+
+
+async def alookup_list(request):
+    digest = _digest(request)
+    return await _alookup(
+        FEED_GENERATION_KEY, lambda generation: LIST_KEY.format(generation=generation, digest=digest))
+
+
+def store(key, data):
+    cache.set(key, data, settings.RECIPE_CACHE_TIMEOUT)
+
+
+def invalidate_recipe(pk):
+    """
+    Moves the recipe to a new version and the feed to a new generation, so
+    older entries are no longer read and expire on their own.
+    """
+    _bump_counter(VERSION_KEY.format(pk=pk))
+    invalidate_feed()
+
+
+def invalidate_recipes(pks):
+    """
+    Moves many recipes to new versions in one call, and the feed to a new
+    generation. New versions start from the current time, like evicted ones.
+    """
+    version = time.time_ns()
+    cache.set_many({VERSION_KEY.format(pk=pk): version for pk in pks}, None)
+    invalidate_feed()
+
+
+def invalidate_feed():
+    _bump_counter(FEED_GENERATION_KEY)
+
+
+def get_stats():
+    stats = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = stats.get(HITS_KEY, 0), stats.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
@@ -0,0 +1,31 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def recipe_etag(rows, *extra):
+    """
+    Strong ETag over `(pk, updated_at, like_count, bookmark_count)` rows plus
+    any extra values that are part of the response, such as pagination links.
+    """
+    parts = [f'{pk}:{updated_at.isoformat()}:{likes}:{bookmarks}'
+             for pk, updated_at, likes, bookmarks in rows]
+    parts += [str(value) for value in extra]
+    return quote_etag(hashlib.sha1('|'.join(parts).encode()).hexdigest())
+
+
+def not_modified(request, validators):
+    """
+    Returns a 304 response if the request's conditional headers match the
+    cached validators, otherwise None.
+    """
+    return get_conditional_response(
+        request, etag=validators['etag'], last_modified=validators.get('last_modified'))
+
+
+def set_validators(response, validators):
+    response['ETag'] = validators['etag']
+    if validators.get('last_modified') is not None:
+        response['Last-Modified'] = http_date(validators['last_modified'])
+    return response
@@ -0,0 +1,26 @@
+from rest_framework.filters import BaseFilterBackend
+
+from .search import get_search_backend
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    """
+    Full-text search over title, description, ingredients and procedure with
+    `?q=`. Results are ordered by relevance.
+    """
+    search_param = 'q'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return get_search_backend().search(queryset, query)
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Search recipes by title, description, ingredients and procedure',
+            'schema': {'type': 'string'},
+        }]
@@ -0,0 +1,47 @@
+import re
+
+UNITS = frozenset((
+    'cup', 'cups', 'tbsp', 'tablespoon', 'tablespoons', 'tsp', 'teaspoon', 'teaspoons',
+    'g', 'gram', 'grams', 'kg', 'mg', 'ml', 'l', 'litre', 'litres', 'liter', 'liters',
+    'oz', 'ounce', 'ounces', 'lb', 'lbs', 'pound', 'pounds', 'pinch', 'dash', 'clove',
+    'cloves', 'slice', 'slices', 'can', 'cans', 'piece', 'pieces', 'handful', 'bunch',
+    'of', 'a', 'an', 'some', 'few', 'large', 'medium', 'small', 'fresh', 'chopped',
+    'sliced', 'diced', 'minced', 'to', 'taste',
+))
+SEPARATOR_RE = re.compile(r'[\n,;]+')
+PARENTHESES_RE = re.compile(r'\([^)]*\)')
+WORD_RE = re.compile(r'[a-z][a-z0-9]*')
+MAX_NAME_LENGTH = 100
+
+
+def singularize(word):
+    """
+    Naive plural stripping, enough to match "tomatoes" with "tomato".
+    """
+    if word.endswith('oes') and len(word) > 4:
+        return word[:-2]
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith('s') and not word.endswith('ss') and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def normalize_ingredient(text):
+    """
+    Reduces one ingredient line such as "2 cups (250g) Tomatoes" to the
+    normalized name "tomato". Returns an empty string if nothing is left.
+    """
+    text = PARENTHESES_RE.sub(' ', text.lower())
+    words = [singularize(word) for word in WORD_RE.findall(text) if word not in UNITS]
+    return ' '.join(words)[:MAX_NAME_LENGTH]
+
+
+def parse_ingredients(text):
+    """
+    Splits the free-text `Recipe.ingredients` on newlines, commas and
+    semicolons and returns the sorted, distinct normalized names.
+    """
+    names = {normalize_ingredient(line) for line in SEPARATOR_RE.split(text or '')}
+    names.discard('')
+    return sorted(names)
@@ -0,0 +1,131 @@
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+REDIS_KEY = 'recipe:likes:pending'
+# Intents taken by a flush stay here until they are written
+REDIS_PROCESSING_KEY = 'recipe:likes:processing'
+REDIS_LOCK_KEY = 'recipe:likes:flush:lock'
+# `LIKE_BUFFER_URL` of the process-local buffer, for tests only
+MEMORY_URL = 'memory://'
+
+# Moves up to ARGV[1] intents from the pending to the processing list and
+# returns them. Intents left in the processing list by a failed flush are
+# returned first, before any new ones are taken.
+DRAIN_SCRIPT = """
+local entries = redis.call('LRANGE', KEYS[2], 0, -1)
+if #entries > 0 then
+    return entries
+end
+entries = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+for i = 1, #entries, 1000 do
+    redis.call('RPUSH', KEYS[2], unpack(entries, i, math.min(i + 999, #entries)))
+end
+redis.call('LTRIM', KEYS[1], #entries, -1)
+return entries
+"""
+
+
+class InMemoryLikeBuffer:
+    """
+    Process-local stand-in for the Redis buffer, used in tests. Other
+    processes, the flush task's included, never see its intents.
+    """
+    def __init__(self):
+        self.intents = deque()
+        self.processing = []
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+
+    def push(self, user_id, recipe_id, liked):
+        with self.lock:
+            self.intents.append((user_id, recipe_id, liked))
+
+    def drain(self, limit):
+        with self.lock:
+            if not self.processing:
+                count = min(limit, len(self.intents))
+                self.processing = [self.intents.popleft() for _ in range(count)]
+            return list(self.processing)
+
+    def ack(self):
+        with self.lock:
+            self.processing = []
+
+    @contextmanager
+    def flushing(self):
+        acquired = self.flush_lock.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.flush_lock.release()
+
+
+class RedisLikeBuffer:
+    """
+    Appends intents to a Redis list shared by every worker. Draining moves
+    a batch to a processing list in one script and `ack` drops it once it is
+    written, so a failed flush leaves its batch for the next one.
+    """
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.drain_script = self.client.register_script(DRAIN_SCRIPT)
+
+    def push(self, user_id, recipe_id, liked):
+        self.client.rpush(REDIS_KEY, f'{user_id}:{recipe_id}:{int(liked)}')
+
+    def drain(self, limit):
+        entries = self.drain_script(keys=[REDIS_KEY, REDIS_PROCESSING_KEY], args=[limit])
+        intents = []
+        for entry in entries:
+            user_id, recipe_id, liked = entry.decode().split(':')
+            intents.append((int(user_id), int(recipe_id), liked == '1'))
+        return intents
+
+    def ack(self):
+        self.client.delete(REDIS_PROCESSING_KEY)
+
+    @contextmanager
+    def flushing(self):
+        # A single flush at a time, so batches are written in push order
+        acquired = bool(self.client.set(REDIS_LOCK_KEY, 1, nx=True, ex=600))
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.client.delete(REDIS_LOCK_KEY)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_like_buffer():
+    """
+    Returns the Redis buffer at `LIKE_BUFFER_URL`, or the in-process one for
+    `memory://`. The URL is required: without a buffer shared with the
+    Celery workers, accepted likes would never be written.
+    """
+    global _buffer
+    url = settings.LIKE_BUFFER_URL
+    if not url:
+        raise ImproperlyConfigured('LIKE_BUFFER_URL must be set to use write-behind likes.')
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = InMemoryLikeBuffer() if url == MEMORY_URL else RedisLikeBuffer(url)
+        return _buffer
+
+
+def latest_intents(intents):
+    """
+    Deduplicates intents so only the last one per `(user, recipe)` is kept.
+    """
+    latest = {}
+    for user_id, recipe_id, liked in intents:
+        latest[user_id, recipe_id] = liked
+    return latest
@@ -0,0 +1,106 @@
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import invalidate_recipe
+from .models import Recipe, RecipeLike
+
+RECIPE_TABLE = Recipe._meta.db_table
+LIKE_TABLE = RecipeLike._meta.db_table
+
+# Largest number of recipe ids accepted in one batch request
+MAX_BATCH_LIKES = 500
+
+# On Postgres the lookup of the recipes, the conflict-tolerant insert or
+# delete and the counter update are one statement. Missing recipes drop out
+# of `targets` instead of raising a (deferred) foreign key error at commit.
+POSTGRES_STATEMENTS = {
+    True: f"""
+        WITH targets AS (
+            SELECT id FROM {RECIPE_TABLE} WHERE id = ANY(%(ids)s)
+        ), changed AS (
+            INSERT INTO {LIKE_TABLE} (user_id, recipe_id, created)
+            SELECT %(user)s, id, %(now)s FROM targets
+            ON CONFLICT (user_id, recipe_id) DO NOTHING
+            RETURNING recipe_id
+        ), counted AS (
+            UPDATE {RECIPE_TABLE} SET like_count = like_count + 1, updated_at = %(now)s
+            WHERE id IN (SELECT recipe_id FROM changed)
+        )
+        SELECT id, id IN (SELECT recipe_id FROM changed) FROM targets
+    """,
+    False: f"""
+        WITH targets AS (
+            SELECT id FROM {RECIPE_TABLE} WHERE id = ANY(%(ids)s)
+        ), changed AS (
+            DELETE FROM {LIKE_TABLE}
+            WHERE user_id = %(user)s AND recipe_id IN (SELECT id FROM targets)
+            RETURNING recipe_id
+        ), counted AS (
+            UPDATE {RECIPE_TABLE} SET like_count = GREATEST(like_count - 1, 0), updated_at = %(now)s
+            WHERE id IN (SELECT recipe_id FROM changed)
+        )
+        SELECT id, id IN (SELECT recipe_id FROM changed) FROM targets
+    """,
+}
+
+# Other databases (SQLite 3.35+) lack data-modifying CTEs: the insert or
+# delete reports the changed rows and the counters follow in a second query
+GENERIC_STATEMENTS = {
+    True: f"""
+        INSERT INTO {LIKE_TABLE} (user_id, recipe_id, created)
+        SELECT %s, id, %s FROM {RECIPE_TABLE} WHERE id IN ({{ids}})
+        ON CONFLICT (user_id, recipe_id) DO NOTHING
+        RETURNING recipe_id
+    """,
+    False: f"""
+        DELETE FROM {LIKE_TABLE} WHERE user_id = %s AND recipe_id IN ({{ids}})
+        RETURNING recipe_id
+    """,
+}
+
+
+def _set_likes_postgres(user_id, recipe_ids, liked, now):
+    with connection.cursor() as cursor:
+        cursor.execute(POSTGRES_STATEMENTS[liked], {'ids': recipe_ids, 'user': user_id, 'now': now})
+        return dict(cursor.fetchall())
+
+
+def _set_likes_generic(user_id, recipe_ids, liked, now):
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    created = connection.ops.adapt_datetimefield_value(now)
+    params = [user_id, created, *recipe_ids] if liked else [user_id, *recipe_ids]
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(GENERIC_STATEMENTS[liked].format(ids=placeholders), params)
+            changed = {recipe_id for recipe_id, in cursor.fetchall()}
+        if changed:
+            Recipe.objects.filter(pk__in=changed).update(
+                like_count=F('like_count') + (1 if liked else -1), updated_at=now)
+    result = dict.fromkeys(changed, True)
+    unchanged = [pk for pk in recipe_ids if pk not in changed]
+    if unchanged:
+        # Only needed to tell missing recipes from ones already in that state
+        result.update(dict.fromkeys(Recipe.objects.filter(pk__in=unchanged).values_list('pk', flat=True), False))
+    return result
+
+
+def set_likes(user, recipe_ids, liked):
+    """
+    Likes (or unlikes) the given recipes for a user and keeps `like_count`
+    in step. Repeating a call changes nothing.
+
+    Returns `{recipe_id: changed}` for every recipe that exists.
+    """
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    if not recipe_ids:
+        return {}
+    now = timezone.now()
+    if connection.vendor == 'postgresql':
+        result = _set_likes_postgres(user.pk, recipe_ids, liked, now)
+    else:
+        result = _set_likes_generic(user.pk, recipe_ids, liked, now)
+    for pk, changed in result.items():
+        if changed:
+            invalidate_recipe(pk)
+    return result
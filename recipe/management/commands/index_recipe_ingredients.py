@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from recipe.models import Recipe, RecipeIngredient
+
+
+# This command backfills the ingredient index for recipes saved before it existed
+class Command(BaseCommand):
+    help = 'Parse the ingredients of every recipe into the ingredient index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = 0
+        indexed = 0
+        while True:
+            batch = list(
+                Recipe.objects.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', 'ingredients')[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            RecipeIngredient.index_recipes(batch)
+            indexed += len(batch)
+        self.stdout.write(f'{indexed} recipes indexed')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from recipe.tasks import reconcile_recipe_counters
+
+
+# This command recomputes the denormalized like and bookmark counters of recipes
+class Command(BaseCommand):
+    help = 'Recompute drifted like and bookmark counters on recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fixed = reconcile_recipe_counters(batch_size=options['batch_size'])
+        self.stdout.write(f'{fixed} recipe counters reconciled')
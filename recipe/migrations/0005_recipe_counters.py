@@ -0,0 +1,43 @@
+# Generated by Django 3.2.9 on 2026-10-18 02:13
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset):
+    counts = queryset.filter(recipe=OuterRef('pk')).order_by().values('recipe')
+    counts = counts.annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def populate_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipe', 'Recipe')
+    RecipeLike = apps.get_model('recipe', 'RecipeLike')
+    Profile = apps.get_model('users', 'Profile')
+    Recipe.objects.update(
+        like_count=_count(RecipeLike.objects.all()),
+        bookmark_count=_count(Profile.bookmarks.through.objects.all()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0004_alter_recipelike_unique_together'),
+        ('users', '0011_alter_customuser_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='bookmark_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.9 on 2026-10-18 02:20
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+# The GIN index is Postgres only, so it is created here instead of through
+# Meta.indexes, which would also try to build it on SQLite
+CREATE_INDEX = 'CREATE INDEX recipe_search_vector_idx ON recipe_recipe USING gin (search_vector)'
+DROP_INDEX = 'DROP INDEX IF EXISTS recipe_search_vector_idx'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Recipe = apps.get_model('recipe', 'Recipe')
+    Recipe.objects.update(search_vector=(
+        SearchVector('title', weight='A', config='english') +
+        SearchVector('desc', weight='B', config='english') +
+        SearchVector('ingredients', weight='B', config='english') +
+        SearchVector('procedure', weight='C', config='english')
+    ))
+    schema_editor.execute(CREATE_INDEX)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0006_recipe_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
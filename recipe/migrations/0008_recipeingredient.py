@@ -0,0 +1,30 @@
+# Generated by Django 3.2.9 on 2026-10-18 02:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0007_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredient_index', to='recipe.recipe')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recipeingredient',
+            index=models.Index(fields=['name', 'recipe'], name='recipe_ingredient_name_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='recipeingredient',
+            unique_together={('recipe', 'name')},
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.9 on 2026-10-18 02:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0008_recipeingredient'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipelike',
+            index=models.Index(fields=['created'], name='recipelike_created_idx'),
+        ),
+    ]
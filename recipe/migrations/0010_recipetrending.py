@@ -0,0 +1,32 @@
+# Generated by Django 3.2.9 on 2026-10-18 10:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0009_recipelike_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeTrending',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='recipe.recipe')),
+                ('score', models.FloatField(default=0)),
+                ('like_count', models.PositiveIntegerField(default=0)),
+                ('bookmark_count', models.PositiveIntegerField(default=0)),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['updated_at'], name='recipe_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipetrending',
+            index=models.Index(fields=['-score'], name='recipetrending_score_idx'),
+        ),
+    ]
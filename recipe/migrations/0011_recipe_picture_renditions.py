@@ -0,0 +1,18 @@
+# Generated by Django 3.2.9 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0010_recipetrending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='picture_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
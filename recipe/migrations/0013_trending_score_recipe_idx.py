@@ -0,0 +1,21 @@
+# Generated by Django 3.2.9 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0012_mediablob'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='recipetrending',
+            name='recipetrending_score_idx',
+        ),
+        migrations.AddIndex(
+            model_name='recipetrending',
+            index=models.Index(fields=['-score', '-recipe'], name='trending_score_recipe_idx'),
+        ),
+    ]
@@ -1,5 +1,9 @@
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models import Count, F, FloatField, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Cast, Coalesce
 from django.conf import settings
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 class RecipeCategory(models.Model):
@@ -22,6 +26,71 @@ def get_default_recipe_category():
     category, created = RecipeCategory.objects.get_or_create(name='Others')
     return category
 
+def _count_subquery(queryset, field):
+    """
+    Wraps a per-recipe count in a correlated subquery, so that several counts
+    can be computed without joining (and multiplying) the related tables.
+    """
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field)
+    counts = counts.annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+def actual_like_count():
+    """
+    Expression counting the `RecipeLike` rows of each recipe.
+    """
+    return _count_subquery(RecipeLike.objects.all(), 'recipe')
+
+def actual_bookmark_count():
+    """
+    Expression counting the profiles that bookmarked each recipe.
+    """
+    return _count_subquery(Recipe.bookmarked_by.through.objects.all(), 'recipe')
+
+class RecipeQuerySet(models.QuerySet):
+    """
+    Recipe queryset helpers
+    """
+    # Serializer fields reading each related row
+    FIELD_RELATIONS = {'author': {'username'}, 'category': {'category', 'category_name'}}
+    # Large text columns that are skipped when not requested
+    DEFERRABLE_FIELDS = ('desc', 'ingredients', 'procedure')
+    # Columns the API never returns, always skipped
+    UNSERIALIZED_FIELDS = ('search_vector',)
+
+    def with_related(self):
+        """
+        Loads author and category in the same query, so serializing a page
+        needs a fixed number of queries.
+        """
+        return self.select_related('author', 'category')
+
+    def for_fields(self, fields):
+        """
+        Loads only what the given `RecipeSerializer` fields read: related rows
+        are joined when shown, unrequested text columns and the search vector
+        are deferred.
+        """
+        fields = set(fields)
+        related = [name for name, used_by in self.FIELD_RELATIONS.items() if fields & used_by]
+        queryset = self.select_related(*related) if related else self
+        deferred = [name for name in self.DEFERRABLE_FIELDS if name not in fields]
+        return queryset.defer(*self.UNSERIALIZED_FIELDS, *deferred)
+
+    def ranked_by_coverage(self, names):
+        """
+        Recipes using any of the given normalized ingredient names, ranked by
+        the share of their ingredients that is covered. Candidates come from
+        the ingredient index, so recipes without a match are never read.
+        """
+        postings = RecipeIngredient.objects.filter(name__in=names)
+        return self.filter(pk__in=postings.values('recipe')).annotate(
+            matched_ingredients=_count_subquery(postings, 'recipe'),
+            total_ingredients=_count_subquery(RecipeIngredient.objects.all(), 'recipe'),
+        ).annotate(
+            coverage=Cast('matched_ingredients', FloatField()) / F('total_ingredients'),
+        ).order_by('-coverage', '-matched_ingredients', '-created_at', '-id')
+
 class Recipe(models.Model):
     """
     Recipe model
@@ -30,7 +99,10 @@ class Recipe(models.Model):
         settings.AUTH_USER_MODEL, related_name="recipes", on_delete=models.CASCADE)
     category = models.ForeignKey(
         RecipeCategory, related_name="recipe_list", on_delete=models.SET(get_default_recipe_category))
+    # Stored by content hash (recipe.storage), which ignores upload_to
     picture = models.ImageField(upload_to='uploads')
+    # Names of the resized copies of `picture`, see recipe.renditions
+    picture_renditions = models.JSONField(default=dict, blank=True, editable=False)
     title = models.CharField(max_length=200)
     desc = models.CharField(_('Short description'), max_length=200)
     cook_time = models.TimeField()
@@ -38,9 +110,23 @@ class Recipe(models.Model):
     procedure = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized counters, kept in step by the like and bookmark endpoints
+    # and recomputed by `recipe.tasks.reconcile_recipe_counters`
+    like_count = models.PositiveIntegerField(default=0)
+    bookmark_count = models.PositiveIntegerField(default=0)
+    # Weighted full-text vector, GIN-indexed on Postgres (see recipe.search)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-created_at', )
+        indexes = [
+            # Backs the (created_at, id) keyset of `RecipeCursorPagination`
+            models.Index(fields=['-created_at', '-id'], name='recipe_created_id_idx'),
+            # Backs the scan for recipes changed since the last trending run
+            models.Index(fields=['updated_at'], name='recipe_updated_at_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -51,6 +137,18 @@ class Recipe(models.Model):
     def get_total_number_of_bookmarks(self):
         return self.bookmarked_by.count()
 
+    @classmethod
+    def adjust_counter(cls, pk, field, delta):
+        """
+        Atomically adds `delta` to a denormalized counter of a recipe. The
+        counters are part of the representation, so `updated_at` moves too.
+        """
+        from .cache import invalidate_recipe
+        updated = cls.objects.filter(pk=pk).update(
+            **{field: F(field) + delta}, updated_at=timezone.now())
+        invalidate_recipe(pk)
+        return updated
+
 class RecipeLike(models.Model):
     """
     Model to like recipes
@@ -61,6 +159,74 @@ class RecipeLike(models.Model):
 
     class Meta:
         unique_together = ('user', 'recipe')
+        indexes = [
+            # Backs the last-24-hours scan of the daily notifications
+            models.Index(fields=['created'], name='recipelike_created_idx'),
+        ]
 
     def __str__(self):
         return self.user.username
+
+
+class RecipeIngredient(models.Model):
+    """
+    Normalized ingredient names parsed from `Recipe.ingredients`, used as an
+    inverted index from ingredient to recipes
+    """
+    recipe = models.ForeignKey(Recipe, related_name='ingredient_index', on_delete=models.CASCADE)
+    name = models.CharField(max_length=100)
+
+    class Meta:
+        unique_together = ('recipe', 'name')
+        indexes = [
+            models.Index(fields=['name', 'recipe'], name='recipe_ingredient_name_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def index_recipes(cls, recipes):
+        """
+        Replaces the index rows of the given `(recipe_id, ingredients)` pairs.
+        """
+        from .ingredients import parse_ingredients
+        recipes = list(recipes)
+        cls.objects.filter(recipe_id__in=[pk for pk, text in recipes]).delete()
+        cls.objects.bulk_create([
+            cls(recipe_id=pk, name=name)
+            for pk, text in recipes for name in parse_ingredients(text)
+        ])
+
+
+class RecipeTrending(models.Model):
+    """
+    Time-decayed trending score of a recipe, maintained incrementally by
+    `recipe.tasks.update_trending_scores` (see recipe.trending)
+    """
+    recipe = models.OneToOneField(Recipe, primary_key=True, related_name='trending', on_delete=models.CASCADE)
+    score = models.FloatField(default=0)
+    # Counters seen by the last run, new likes and bookmarks are the difference
+    like_count = models.PositiveIntegerField(default=0)
+    bookmark_count = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # Backs the (score, recipe) keyset of `TrendingCursorPagination`
+            models.Index(fields=['-score', '-recipe'], name='trending_score_recipe_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.score}'
+
+
+class MediaBlob(models.Model):
+    """
+    Reference count of a file of `recipe.storage.ContentAddressedStorage`
+    """
+    name = models.CharField(max_length=255, primary_key=True)
+    references = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,159 @@
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination, _reverse_ordering
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Keyset pagination over the recipe feed.
+
+    The cursor holds the `(created_at, id)` pair of the last row of a page and
+    the next page is read with a seek on the matching composite index, so any
+    page costs the same as the first one and no `COUNT(*)` is run.
+    """
+    ordering = ('-created_at', '-id')
+    # Datetime attribute of the rows paired with `id` in the cursor position
+    position_field = 'created_at'
+
+    def _get_position_from_instance(self, instance, ordering):
+        return f'{getattr(instance, self.position_field).isoformat()}|{instance.id}'
+
+    def _parse_position(self, position):
+        try:
+            created_at, pk = position.rsplit('|', 1)
+            created_at, pk = parse_datetime(created_at), int(pk)
+        except (TypeError, ValueError):
+            created_at = None
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        # Seek past the cursor row: rows are in descending order, so moving
+        # forward means smaller (created_at, id) pairs and backward larger ones
+        if current_position is not None:
+            created_at, pk = self._parse_position(current_position)
+            lookup = 'gt' if reverse else 'lt'
+            field = self.position_field
+            queryset = queryset.filter(
+                Q(**{f'{field}__{lookup}': created_at}) |
+                Q(**{field: created_at, f'id__{lookup}': pk})
+            )
+
+        # Positions are unique, so the offset is always zero for cursors built
+        # here; fetch one extra row to know whether another page follows
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = (current_position is not None) or (offset > 0)
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+
+class BookmarkCursorPagination(RecipeCursorPagination):
+    """
+    Keyset pagination over a profile's bookmarked recipes, newest bookmark
+    first, seeking on the `(profile, created, recipe)` index of the bookmarks.
+    """
+    ordering = ('-bookmarked_at', '-id')
+    position_field = 'bookmarked_at'
+
+
+class TrendingCursorPagination(RecipeCursorPagination):
+    """
+    Keyset pagination over the trending ranking, highest score first,
+    seeking on the `(score, recipe)` index of the ranking table.
+    """
+    ordering = ('-trending__score', '-id')
+    position_field = 'trending__score'
+
+    def _get_position_from_instance(self, instance, ordering):
+        return f'{instance.trending_score!r}|{instance.id}'
+
+    def _parse_position(self, position):
+        try:
+            score, pk = position.rsplit('|', 1)
+            return float(score), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class BookmarkIdsPagination(PageNumberPagination):
+    """
+    Large pages for the ids-only bookmark list, which reads nothing but the
+    through table's index.
+    """
+    page_size = 1000
+    page_size_query_param = 'page_size'
+    max_page_size = 5000
+
+
+class OptInCursorPaginationMixin:
+    """
+    Keeps page number pagination as the default and switches a list view to
+    `RecipeCursorPagination` when the client sends `?pagination=cursor` (or
+    follows a `cursor` link).
+
+    The cursor re-sorts rows by its own keyset, so it is refused with a 400
+    on ranked results: viewset actions outside `cursor_pagination_actions`
+    and requests with one of the `ranking_query_params`.
+    """
+    cursor_pagination_class = RecipeCursorPagination
+    cursor_pagination_actions = ('list',)
+    ranking_query_params = ()
+
+    def check_cursor_pagination(self, params):
+        action = getattr(self, 'action', None)
+        ranked = (
+            (action is not None and action not in self.cursor_pagination_actions)
+            or any(params.get(param, '').strip() for param in self.ranking_query_params)
+        )
+        if ranked:
+            raise ValidationError({'pagination': 'Cursor pagination is not available for ranked results.'})
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            request = getattr(self, 'request', None)
+            params = request.query_params if request is not None else {}
+            if params.get('pagination') == 'cursor' or 'cursor' in params:
+                self.check_cursor_pagination(params)
+                self._paginator = self.cursor_pagination_class()
+            else:
+                return super().paginator
+        return self._paginator
@@ -0,0 +1,81 @@
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+# Fixed output widths, images narrower than a width are not upscaled
+RENDITION_WIDTHS = {'thumbnail': 160, 'card': 480, 'full': 1280}
+# File extension and Pillow format of every rendition
+RENDITION_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+QUALITY = 80
+
+
+def rendition_name(name, size, ext):
+    """
+    `uploads/pie.jpg` becomes `uploads/renditions/pie_card.webp`.
+    """
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, 'renditions', f'{stem}_{size}.{ext}')
+
+
+def make_renditions(field_file):
+    """
+    Writes every size and format of an image next to the original and
+    returns `{'source': name, size: {ext: name}}`. The original is decoded
+    once, at reduced scale where the format allows, and each size is scaled
+    down from the previous, larger one.
+    """
+    storage, name = field_file.storage, field_file.name
+    with storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        # JPEGs are decoded at the smallest scale still wider than `full`
+        width = max(RENDITION_WIDTHS.values())
+        if image.width > width:
+            image.draft('RGB', (width, image.height * width // image.width))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+    renditions = {'source': name}
+    for size, width in sorted(RENDITION_WIDTHS.items(), key=lambda item: -item[1]):
+        if image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        renditions[size] = {}
+        for ext, image_format in RENDITION_FORMATS.items():
+            buffer = BytesIO()
+            image.save(buffer, image_format, quality=QUALITY)
+            renditions[size][ext] = storage.save(rendition_name(name, size, ext), ContentFile(buffer.getvalue()))
+    return renditions
+
+
+def delete_renditions(storage, renditions):
+    for size in RENDITION_WIDTHS:
+        for name in (renditions.get(size) or {}).values():
+            storage.delete(name)
+
+
+def rendition_urls(renditions, name, url):
+    """
+    `{size: {ext: url}}` for an image field value, with `url` turning a
+    stored name into a URL. Until the renditions of the current file exist
+    every entry points at the original. No file, no renditions.
+    """
+    if not name:
+        return None
+    if renditions and renditions.get('source') == name:
+        return {size: {ext: url(renditions[size][ext]) for ext in RENDITION_FORMATS} for size in RENDITION_WIDTHS}
+    original = url(name)
+    return {size: dict.fromkeys(RENDITION_FORMATS, original) for size in RENDITION_WIDTHS}
+
+
+def queue_renditions(instance, field_name):
+    """
+    Queues `recipe.tasks.generate_image_renditions` for a new or replaced
+    image once the transaction commits.
+    """
+    from .tasks import generate_image_renditions
+    name = getattr(instance, field_name).name
+    if name and getattr(instance, f'{field_name}_renditions').get('source') != name:
+        label, pk = instance._meta.label, instance.pk
+        transaction.on_commit(lambda: generate_image_renditions.delay(label, pk, field_name))
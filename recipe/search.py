@@ -0,0 +1,173 @@
+import heapq
+import math
+import re
+import threading
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Value, When
+
+# Searchable recipe fields and their weights, highest first
+SEARCH_FIELDS = (('title', 'A'), ('desc', 'B'), ('ingredients', 'B'), ('procedure', 'C'))
+# Same scale Postgres' ts_rank uses for the A-D weight labels
+WEIGHT_VALUES = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+
+STOP_WORDS = frozenset((
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'into',
+    'is', 'it', 'of', 'on', 'or', 'the', 'then', 'to', 'with',
+))
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase search terms, dropping stop words.
+    """
+    return [token for token in TOKEN_RE.findall(text.lower())
+            if len(token) > 1 and token not in STOP_WORDS]
+
+
+def search_vector():
+    """
+    Weighted search vector expression over `SEARCH_FIELDS`.
+    """
+    vector = None
+    for field, weight in SEARCH_FIELDS:
+        part = SearchVector(field, weight=weight, config='english')
+        vector = part if vector is None else vector + part
+    return vector
+
+
+class InvertedIndex:
+    """
+    In-memory inverted index mapping terms to weighted term frequencies.
+
+    Queries intersect the postings of every term, starting with the rarest,
+    and rank the surviving documents by tf-idf, so the cost depends on how
+    many documents match rather than on the size of the corpus.
+    """
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.doc_terms = {}
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def add(self, doc_id, fields):
+        scores = defaultdict(float)
+        for field, weight in SEARCH_FIELDS:
+            for token in tokenize(fields.get(field) or ''):
+                scores[token] += WEIGHT_VALUES[weight]
+        with self.lock:
+            self.remove(doc_id)
+            for token, score in scores.items():
+                self.postings[token][doc_id] = score
+            self.doc_terms[doc_id] = tuple(scores)
+
+    def remove(self, doc_id):
+        with self.lock:
+            for token in self.doc_terms.pop(doc_id, ()):
+                posting = self.postings[token]
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[token]
+
+    def search(self, query, limit):
+        terms = set(tokenize(query))
+        with self.lock:
+            postings = sorted((self.postings.get(term, {}) for term in terms), key=len)
+            if not postings or not postings[0]:
+                return []
+            total = len(self.doc_terms)
+            idf = [math.log(1 + total / len(posting)) for posting in postings]
+            candidates = set(postings[0]).intersection(*postings[1:])
+            scored = (
+                (sum(posting[doc_id] * weight for posting, weight in zip(postings, idf)), doc_id)
+                for doc_id in candidates
+            )
+            return [doc_id for score, doc_id in heapq.nlargest(limit, scored)]
+
+
+class PostgresSearchBackend:
+    """
+    Ranks recipes with the stored, GIN-indexed `Recipe.search_vector`.
+    """
+    def search(self, queryset, query):
+        search_query = SearchQuery(query, search_type='websearch', config='english')
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-rank', '-created_at', '-id')
+
+    def update(self, recipe):
+        self.update_many([recipe])
+
+    def update_many(self, recipes):
+        pks = [recipe.pk for recipe in recipes]
+        if pks:
+            type(recipes[0]).objects.filter(pk__in=pks).update(search_vector=search_vector())
+
+    def remove(self, recipe):
+        pass
+
+
+class InvertedIndexSearchBackend:
+    """
+    Fallback for databases without full-text search (SQLite in local runs and
+    tests). The index lives in the process and is built on the first search.
+    """
+    max_results = 1000
+
+    def __init__(self):
+        self.index = None
+        self.lock = threading.Lock()
+
+    def get_index(self, model):
+        with self.lock:
+            if self.index is None:
+                index = InvertedIndex()
+                fields = [field for field, weight in SEARCH_FIELDS]
+                rows = model.objects.order_by().values_list('pk', *fields)
+                for pk, *values in rows.iterator():
+                    index.add(pk, dict(zip(fields, values)))
+                self.index = index
+            return self.index
+
+    def reset(self):
+        with self.lock:
+            self.index = None
+
+    def search(self, queryset, query):
+        ids = self.get_index(queryset.model).search(query, self.max_results)
+        ranking = Case(
+            *[When(pk=pk, then=Value(position)) for position, pk in enumerate(ids)],
+            output_field=IntegerField(),
+        ) if ids else Value(0, output_field=IntegerField())
+        return queryset.filter(pk__in=ids).annotate(rank=ranking).order_by('rank')
+
+    def update(self, recipe):
+        self.update_many([recipe])
+
+    def update_many(self, recipes):
+        # Only keep a built index current, the first search reads everything
+        if self.index is not None:
+            for recipe in recipes:
+                self.index.add(recipe.pk, {field: getattr(recipe, field) for field, weight in SEARCH_FIELDS})
+
+    def remove(self, recipe):
+        if self.index is not None:
+            self.index.remove(recipe.pk)
+
+
+postgres_backend = PostgresSearchBackend()
+inverted_index_backend = InvertedIndexSearchBackend()
+
+
+def get_search_backend():
+    """
+    Returns the search backend matching the default database.
+    """
+    if connection.vendor == 'postgresql':
+        return postgres_backend
+    return inverted_index_backend
@@ -1,24 +1,139 @@
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.utils.encoding import filepath_to_uri
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from .models import Recipe, RecipeCategory, RecipeLike
+from .renditions import rendition_urls
+from .uploads import HeaderValidatedImageField
+
+
+def requested_fields(request, field_names):
+    """
+    Field names kept by the `?fields=a,b` and `?omit=a,b` query parameters of
+    a read request, in their declared order. Unknown names are ignored.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return list(field_names)
+    fields = request.query_params.get('fields')
+    omit = request.query_params.get('omit')
+    kept = set(fields.split(',')) if fields else set(field_names)
+    if omit:
+        kept -= set(omit.split(','))
+    return [name for name in field_names if name in kept]
+
+
+class SparseFieldsetsMixin:
+    """
+    Drops the fields not selected with `?fields=` / `?omit=`, so their values
+    (including `SerializerMethodField`s) are never computed.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        kept = set(requested_fields(self.context.get('request'), self.fields))
+        for name in list(self.fields):
+            if name not in kept:
+                self.fields.pop(name)
+
+
+# Per-viewer fields of `RecipeSerializer`, never part of cached responses
+VIEWER_FIELDS = ('is_liked', 'is_bookmarked')
+
+
+def viewer_flags(user, recipe_ids):
+    """
+    Ids among `recipe_ids` liked and bookmarked by `user`, as two sets read
+    with one query each.
+    """
+    liked = RecipeLike.objects.filter(user=user, recipe_id__in=recipe_ids).values_list('recipe_id', flat=True)
+    bookmarked = Recipe.bookmarked_by.through.objects.filter(
+        profile__user=user, recipe_id__in=recipe_ids).values_list('recipe_id', flat=True)
+    return {'is_liked': set(liked), 'is_bookmarked': set(bookmarked)}
+
+
+def add_viewer_flags(items, user, fields):
+    """
+    Copies of serialized recipes with the requested `VIEWER_FIELDS` set for
+    `user`, filled by `viewer_flags` for the whole list.
+    """
+    flags = viewer_flags(user, [item['id'] for item in items])
+    return [{**item, **{name: item['id'] in flags[name] for name in fields}} for item in items]
+
+
+def viewer_fields(request):
+    """
+    The `VIEWER_FIELDS` a request asks for, none for anonymous viewers.
+    """
+    if request is None or not request.user.is_authenticated:
+        return []
+    return requested_fields(request, VIEWER_FIELDS)
+
+
+def image_url_builder(storage, request=None):
+    """
+    Function turning a stored file name into the URL an `ImageField` shows,
+    absolute when there is a request.
+    """
+    if request is None:
+        return storage.url
+    if isinstance(storage, FileSystemStorage):
+        # Same URL as storage.url + build_absolute_uri, with the prefix resolved once
+        prefix = request.build_absolute_uri(storage.base_url)
+        return lambda name: prefix + filepath_to_uri(name)
+    build_uri = request.build_absolute_uri
+    return lambda name: build_uri(storage.url(name))
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """
+    Reads the viewer flags of a whole page with two queries before the rows
+    are serialized.
+    """
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, models.Manager) else data
+        request = self.context.get('request')
+        if viewer_fields(request):
+            recipes = list(recipes)
+            self._context['viewer_flags'] = viewer_flags(request.user, [recipe.pk for recipe in recipes])
+        return super().to_representation(recipes)
+
 
 class RecipeCategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = RecipeCategory
         fields = ('id', 'name')
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     author = serializers.PrimaryKeyRelatedField(read_only=True)
     username = serializers.SerializerMethodField()
     category_name = serializers.SerializerMethodField()
     category = RecipeCategorySerializer()
     total_number_of_likes = serializers.SerializerMethodField()
     total_number_of_bookmarks = serializers.SerializerMethodField()
+    picture_renditions = serializers.SerializerMethodField()
+    is_liked = serializers.SerializerMethodField()
+    is_bookmarked = serializers.SerializerMethodField()
+
+    # Uploads are validated from the image header, see recipe.uploads
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping, models.ImageField: HeaderValidatedImageField}
 
     class Meta:
         model = Recipe
         fields = ('id', 'category', 'category_name', 'picture', 'title', 'desc',
                   'cook_time', 'ingredients', 'procedure', 'author', 'username',
-                  'total_number_of_likes', 'total_number_of_bookmarks')
+                  'total_number_of_likes', 'total_number_of_bookmarks', 'picture_renditions',
+                  *VIEWER_FIELDS)
+        list_serializer_class = RecipeListSerializer
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only authenticated viewers get `is_liked` / `is_bookmarked`, never
+        # in the bodies shared by every viewer (`shared` context)
+        kept = [] if self.context.get('shared') else viewer_fields(self.context.get('request'))
+        for name in VIEWER_FIELDS:
+            if name not in kept:
+                self.fields.pop(name, None)
 
     def get_username(self, obj):
         return obj.author.username
@@ -27,10 +142,29 @@ class RecipeSerializer(serializers.ModelSerializer):
         return obj.category.name
 
     def get_total_number_of_likes(self, obj):
-        return obj.get_total_number_of_likes()
+        return obj.like_count
 
     def get_total_number_of_bookmarks(self, obj):
-        return obj.get_total_number_of_bookmarks()
+        return obj.bookmark_count
+
+    def get_picture_renditions(self, obj):
+        url = image_url_builder(obj.picture.storage, self.context.get('request'))
+        return rendition_urls(obj.picture_renditions, obj.picture.name, url)
+
+    def get_is_liked(self, obj):
+        return obj.pk in self.get_viewer_flags(obj)['is_liked']
+
+    def get_is_bookmarked(self, obj):
+        return obj.pk in self.get_viewer_flags(obj)['is_bookmarked']
+
+    def get_viewer_flags(self, obj):
+        # Set for the whole page by RecipeListSerializer, read here for a single recipe
+        flags = self.context.get('viewer_flags')
+        if flags is None:
+            flags = viewer_flags(self.context['request'].user, [obj.pk])
+            if self.root is self:
+                self._context['viewer_flags'] = flags
+        return flags
 
     def create(self, validated_data):
         category = validated_data.pop('category')
@@ -51,9 +185,80 @@ class RecipeSerializer(serializers.ModelSerializer):
         return super(RecipeSerializer, self).update(instance, validated_data)
 
 
+class BulkRecipeSerializer(RecipeSerializer):
+    """
+    Validates one item of a bulk import. Items with an `id` update that
+    recipe, the others create one. Pictures are uploaded separately.
+    """
+    id = serializers.IntegerField(required=False)
+    picture = serializers.ImageField(read_only=True)
+
+
 class RecipeLikeSerializer(serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(read_only=True)
 
     class Meta:
         model = RecipeLike
         fields = ('id', 'user', 'recipe')
+
+
+class RecipeRowSerializer:
+    """
+    Read-only fast path producing the same JSON as `RecipeSerializer` from
+    `values_list(named=True)` rows. The columns and a getter per output field
+    are resolved once, so each row is a dict built from plain tuple lookups
+    instead of a `to_representation` call per field.
+    """
+    # Columns read by each output field of `RecipeSerializer`
+    FIELD_COLUMNS = {
+        'id': ('id',),
+        'category': ('category_id', 'category__name'),
+        'category_name': ('category__name',),
+        'picture': ('picture',),
+        'title': ('title',),
+        'desc': ('desc',),
+        'cook_time': ('cook_time',),
+        'ingredients': ('ingredients',),
+        'procedure': ('procedure',),
+        'author': ('author_id',),
+        'username': ('author__username',),
+        'total_number_of_likes': ('like_count',),
+        'total_number_of_bookmarks': ('bookmark_count',),
+        'picture_renditions': ('picture_renditions', 'picture'),
+    }
+    # Always loaded: row identity, cursor position and ETag validators
+    BASE_COLUMNS = ('id', 'created_at', 'updated_at', 'like_count', 'bookmark_count')
+
+    def __init__(self, fields, request=None):
+        self.fields = [name for name in fields if name in self.FIELD_COLUMNS]
+        columns = list(self.BASE_COLUMNS)
+        for name in self.fields:
+            columns += [column for column in self.FIELD_COLUMNS[name] if column not in columns]
+        self.columns = columns
+        self.request = request
+        self.getters = [self._compile(name, columns.index) for name in self.fields]
+
+    def _compile(self, name, index):
+        if name == 'category':
+            pk, category_name = index('category_id'), index('category__name')
+            return lambda row: {'id': row[pk], 'name': row[category_name]}
+        position = index(self.FIELD_COLUMNS[name][0])
+        if name in ('picture', 'picture_renditions'):
+            url = image_url_builder(Recipe._meta.get_field('picture').storage, self.request)
+            if name == 'picture_renditions':
+                picture = index('picture')
+                return lambda row: rendition_urls(row[position], row[picture], url)
+            return lambda row: url(row[position]) if row[position] else None
+        if name == 'cook_time':
+            return lambda row: row[position].isoformat() if row[position] is not None else None
+        return lambda row: row[position]
+
+    def rows(self, queryset):
+        """
+        Narrows a recipe queryset to the columns of the plan.
+        """
+        return queryset.values_list(*self.columns, named=True)
+
+    def to_representation(self, rows):
+        fields, getters = self.fields, self.getters
+        return [dict(zip(fields, [get(row) for get in getters])) for row in rows]
@@ -0,0 +1,101 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import invalidate_recipe, invalidate_recipes
+from .models import Recipe, RecipeCategory, RecipeIngredient
+from .renditions import queue_renditions
+from .search import get_search_backend
+from .storage import release_files, release_replaced_file
+
+
+# Keep the search index current with recipe changes
+@receiver(post_save, sender=Recipe)
+def update_search_index(sender, instance, **kwargs):
+    get_search_backend().update(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_search_index(sender, instance, **kwargs):
+    get_search_backend().remove(instance)
+
+
+# Re-parse the ingredient index when the ingredients changed
+@receiver(pre_save, sender=Recipe)
+def note_ingredients_change(sender, instance, update_fields=None, **kwargs):
+    instance._ingredients_changed = (
+        (update_fields is None or 'ingredients' in update_fields)
+        and (instance._state.adding
+             or not sender.objects.filter(pk=instance.pk, ingredients=instance.ingredients).exists())
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def update_ingredient_index(sender, instance, **kwargs):
+    if getattr(instance, '_ingredients_changed', True):
+        RecipeIngredient.index_recipes([(instance.pk, instance.ingredients)])
+
+
+# Drop cached responses of a changed or deleted recipe
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_cache(sender, instance, **kwargs):
+    invalidate_recipe(instance.pk)
+
+
+# Recipe bodies show the author's username and the category name, so
+# renaming either changes their recipes, as far as caches can tell
+def _note_rename(sender, instance, field, update_fields):
+    instance._renamed = (
+        instance.pk is not None
+        and (update_fields is None or field in update_fields)
+        and sender.objects.filter(pk=instance.pk).exclude(**{field: getattr(instance, field)}).exists()
+    )
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def note_author_rename(sender, instance, update_fields=None, **kwargs):
+    _note_rename(sender, instance, 'username', update_fields)
+
+
+@receiver(pre_save, sender=RecipeCategory)
+def note_category_rename(sender, instance, update_fields=None, **kwargs):
+    _note_rename(sender, instance, 'name', update_fields)
+
+
+def _touch_recipes(recipes):
+    # `updated_at` feeds the ETag and Last-Modified of the recipes, so
+    # clients revalidating a copy with the old name get the new one
+    pks = list(recipes.values_list('pk', flat=True))
+    recipes.update(updated_at=timezone.now())
+    invalidate_recipes(pks)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_author_recipes_cache(sender, instance, **kwargs):
+    if getattr(instance, '_renamed', False):
+        _touch_recipes(Recipe.objects.filter(author=instance))
+
+
+@receiver(post_save, sender=RecipeCategory)
+def invalidate_category_recipes_cache(sender, instance, **kwargs):
+    if getattr(instance, '_renamed', False):
+        _touch_recipes(Recipe.objects.filter(category=instance))
+
+
+# Resize new pictures in the background
+@receiver(post_save, sender=Recipe)
+def queue_picture_renditions(sender, instance, **kwargs):
+    queue_renditions(instance, 'picture')
+
+
+# Release the stored files a recipe no longer uses, see recipe.storage
+@receiver(pre_save, sender=Recipe)
+def release_replaced_picture(sender, instance, **kwargs):
+    release_replaced_file(sender, instance, 'picture')
+
+
+@receiver(post_delete, sender=Recipe)
+def release_picture(sender, instance, **kwargs):
+    release_files(instance, 'picture')
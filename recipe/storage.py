@@ -0,0 +1,157 @@
+import hashlib
+import posixpath
+from datetime import timedelta
+from itertools import islice
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+# Directory of the content-addressed files under MEDIA_ROOT
+BLOB_DIRECTORY = 'blobs'
+# Age after which a blob file without references is an orphan, not a save
+# still in progress
+ORPHAN_GRACE = timedelta(hours=1)
+# Served with `Cache-Control: immutable`, the content of a name never changes
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+class BlobExists(Exception):
+    pass
+
+
+def is_content_addressed(name):
+    return name.startswith(f'{BLOB_DIRECTORY}/')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every file under the SHA-256 of its content, so identical uploads
+    share one file. `recipe.models.MediaBlob` counts the references to each
+    file: saving adds one, deleting drops one and the file is only removed
+    with the last reference. Files saved before this storage (with their
+    upload names) are never deleted by it, and `upload_to` is ignored.
+
+    A file is written inside the transaction that adds its reference. When
+    that transaction rolls back, the file stays without a reference until
+    `sweep_orphans` removes it.
+    """
+    def blob_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        ext = posixpath.splitext(name)[1].lower()
+        return posixpath.join(BLOB_DIRECTORY, digest[:2], digest[2:4], f'{digest}{ext}')
+
+    def save(self, name, content, max_length=None):
+        from .models import MediaBlob
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.blob_name(name, content)
+        with transaction.atomic():
+            # The row lock orders concurrent saves and deletes of one blob
+            MediaBlob.objects.select_for_update().get_or_create(name=name)
+            if not self.exists(name):
+                try:
+                    self._save(name, content)
+                except BlobExists:
+                    pass
+            MediaBlob.objects.filter(name=name).update(references=F('references') + 1)
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # Only reached when another process wrote the same blob first
+        if self.exists(name):
+            raise BlobExists(name)
+        return name
+
+    def delete(self, name):
+        from .models import MediaBlob
+        if not name or not is_content_addressed(name):
+            return
+        with transaction.atomic():
+            blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                return
+            if blob.references > 1:
+                MediaBlob.objects.filter(name=name).update(references=F('references') - 1)
+                return
+            blob.delete()
+            super().delete(name)
+
+    def blob_names(self):
+        if not self.exists(BLOB_DIRECTORY):
+            return
+        for first in self.listdir(BLOB_DIRECTORY)[0]:
+            for second in self.listdir(posixpath.join(BLOB_DIRECTORY, first))[0]:
+                directory = posixpath.join(BLOB_DIRECTORY, first, second)
+                for file_name in self.listdir(directory)[1]:
+                    yield posixpath.join(directory, file_name)
+
+    def sweep_orphans(self, grace=ORPHAN_GRACE, batch_size=1000):
+        """
+        Removes the blob files older than `grace` that no reference counts.
+        Each candidate is checked under its row lock, so a concurrent save
+        of the same content either waits or keeps the file.
+
+        Returns the number of files removed.
+        """
+        from .models import MediaBlob
+        cutoff = timezone.now() - grace
+        removed = 0
+        names = self.blob_names()
+        while True:
+            batch = list(islice(names, batch_size))
+            if not batch:
+                break
+            old = [name for name in batch if self.get_modified_time(name) <= cutoff]
+            referenced = set(MediaBlob.objects.filter(name__in=old, references__gt=0).values_list('name', flat=True))
+            for name in old:
+                if name in referenced:
+                    continue
+                with transaction.atomic():
+                    blob, _ = MediaBlob.objects.select_for_update().get_or_create(name=name)
+                    if blob.references:
+                        continue
+                    blob.delete()
+                    super().delete(name)
+                    removed += 1
+        return removed
+
+
+def release_replaced_file(model, instance, field_name):
+    """
+    Drops the reference of the file an instance is about to replace with a
+    new upload (or clear), once the transaction commits. Saves that keep the
+    stored file do not query.
+    """
+    field_file = getattr(instance, field_name)
+    if instance.pk is None or (field_file._committed and field_file.name):
+        return
+    previous = model.objects.filter(pk=instance.pk).values_list(field_name, flat=True).first()
+    if previous and previous != field_file.name:
+        storage = field_file.storage
+        transaction.on_commit(lambda: storage.delete(previous))
+
+
+def release_files(instance, field_name):
+    """
+    Drops the references of a deleted instance's file and its renditions.
+    """
+    from .renditions import delete_renditions
+    field_file = getattr(instance, field_name)
+    if field_file:
+        storage, name = field_file.storage, field_file.name
+        renditions = getattr(instance, f'{field_name}_renditions')
+
+        def release():
+            storage.delete(name)
+            delete_renditions(storage, renditions)
+        transaction.on_commit(release)
@@ -1,10 +1,27 @@
 import logging
+import operator
+import time
+from functools import reduce
+from smtplib import SMTPException
 from celery import shared_task
-from django.core.mail import send_mail
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMessage, get_connection, send_mail
 from django.conf import settings
-from users.models import CustomUser
-from recipe.models import RecipeLike
-from datetime import datetime, timedelta
+from users.authentication import invalidate_user
+from users.blacklist import build_blacklist_filter, prune_expired_tokens, rebuild_blacklist_filter
+from users.models import CustomUser, Profile
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from recipe.cache import invalidate_recipe
+from recipe.like_buffer import get_like_buffer, latest_intents
+from recipe.models import Recipe, RecipeLike, actual_bookmark_count, actual_like_count
+from recipe.renditions import delete_renditions, make_renditions
+from recipe.storage import ContentAddressedStorage
+from recipe.trending import update_scores
+from PIL import Image
+from datetime import timedelta
 
 logger = logging.getLogger(__name__)
 
@@ -17,21 +34,232 @@ def send_notification_email(subject, message, recipient_list):
     except Exception as e:
         logger.error(f'Error sending email: {e}')
 
-# Function to check the number of likes using celery worker and beat 
+# Function to send a batch of emails over one SMTP connection, paced to
+# EMAIL_BATCH_RATE_PER_SECOND. Messages are dicts with `subject`, `body` and
+# `to`; the failed ones (all of them when the connection cannot be opened)
+# are retried with exponential backoff, carrying the count already sent, and
+# the task returns the sent/failed counts
+@shared_task(bind=True, max_retries=5)
+def send_email_batch(self, messages, sent=0):
+    failed = []
+    interval = 1 / settings.EMAIL_BATCH_RATE_PER_SECOND if settings.EMAIL_BATCH_RATE_PER_SECOND else 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except (SMTPException, OSError) as e:
+        logger.error(f'Error opening the email connection: {e}')
+        failed = list(messages)
+    else:
+        try:
+            for position, message in enumerate(messages):
+                if interval and position:
+                    time.sleep(interval)
+                email = EmailMessage(message['subject'], message['body'], settings.EMAIL_HOST_USER, message['to'],
+                                     connection=connection)
+                try:
+                    sent += connection.send_messages([email])
+                except Exception as e:
+                    logger.error(f'Error sending email to {message["to"]}: {e}')
+                    failed.append(message)
+        finally:
+            connection.close()
+    logger.info(f'Email batch: {sent} sent, {len(failed)} failed')
+    if failed and self.request.retries < self.max_retries:
+        countdown = settings.EMAIL_RETRY_BACKOFF * 2 ** self.request.retries
+        self.retry(args=[failed], kwargs={'sent': sent}, countdown=countdown)
+    return {'sent': sent, 'failed': len(failed)}
+
+
+# Recipients per send_email_batch task
+NOTIFICATION_CHUNK_SIZE = 1000
+
+
+def like_notification(email, total_likes):
+    return {
+        'subject': 'Daily Likes Notification',
+        'body': f'You received {total_likes} new likes on your recipes in the last 24 hours.',
+        'to': [email],
+    }
+
+
+# Function to check the number of likes using celery worker and beat.
+# One grouped query counts the likes each author received in the last 24
+# hours and the emails are fanned out in chunks to send_email_batch
 @shared_task
 def send_daily_notifications():
     logger.info('Task started: send_daily_notifications')
+    chunks = 0
     try:
-        yesterday = datetime.now() - timedelta(days=1)
-        authors = CustomUser.objects.all()
-        for author in authors:
-            total_likes = RecipeLike.objects.filter(user=author, created__gte=yesterday).count()
-            if total_likes > 0:
-                subject = 'Daily Likes Notification'
-                message = f'You received {total_likes} new likes on your recipes in the last 24 hours.'
-                recipient_list = [author.email]
-                send_notification_email.delay(subject, message, recipient_list)
+        yesterday = timezone.now() - timedelta(days=1)
+        totals = (
+            RecipeLike.objects.filter(created__gte=yesterday)
+            .values('recipe__author_id', 'recipe__author__email')
+            .annotate(total_likes=Count('id'))
+            .order_by()
+            .values_list('recipe__author__email', 'total_likes')
+        )
+        chunk = []
+        for email, total_likes in totals.iterator(chunk_size=NOTIFICATION_CHUNK_SIZE):
+            chunk.append(like_notification(email, total_likes))
+            if len(chunk) == NOTIFICATION_CHUNK_SIZE:
+                send_email_batch.delay(chunk)
+                chunks += 1
+                chunk = []
+        if chunk:
+            send_email_batch.delay(chunk)
+            chunks += 1
     except Exception as e:
         logger.error(f'Error occurred: {e}')
     finally:
-        logger.info('Task completed')
+        logger.info(f'Task completed: {chunks} notification chunks queued')
+
+# Function to recompute drifted like and bookmark counters in batches of recipes
+@shared_task
+def reconcile_recipe_counters(batch_size=1000):
+    logger.info('Task started: reconcile_recipe_counters')
+    fixed = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            Recipe.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1]
+        drifted = Recipe.objects.filter(pk__in=batch).annotate(
+            actual_likes=actual_like_count(),
+            actual_bookmarks=actual_bookmark_count(),
+        ).filter(~Q(like_count=F('actual_likes')) | ~Q(bookmark_count=F('actual_bookmarks')))
+        drifted = list(drifted.values_list('pk', flat=True))
+        if not drifted:
+            continue
+        # The counts are recomputed inside the UPDATE so concurrent likes are not lost
+        fixed += Recipe.objects.filter(pk__in=drifted).update(
+            like_count=actual_like_count(),
+            bookmark_count=actual_bookmark_count(),
+        )
+        for pk in drifted:
+            invalidate_recipe(pk)
+    logger.info(f'Task completed: {fixed} recipe counters reconciled')
+    return fixed
+
+
+def write_like_intents(latest):
+    """
+    Applies deduplicated `{(user_id, recipe_id): liked}` intents with one bulk
+    insert, batched deletes and one counter update, skipping intents whose
+    user or recipe no longer exists.
+    """
+    recipe_ids = set(Recipe.objects.filter(pk__in={r for u, r in latest}).values_list('pk', flat=True))
+    user_ids = set(CustomUser.objects.filter(pk__in={u for u, r in latest}).values_list('pk', flat=True))
+    latest = {(u, r): liked for (u, r), liked in latest.items() if u in user_ids and r in recipe_ids}
+    likes = [RecipeLike(user_id=u, recipe_id=r) for (u, r), liked in latest.items() if liked]
+    unlikes = [Q(user_id=u, recipe_id=r) for (u, r), liked in latest.items() if not liked]
+    touched = {r for u, r in latest}
+    with transaction.atomic():
+        RecipeLike.objects.bulk_create(likes, batch_size=1000, ignore_conflicts=True)
+        for start in range(0, len(unlikes), 500):
+            RecipeLike.objects.filter(reduce(operator.or_, unlikes[start:start + 500])).delete()
+        # Exact recount of the touched recipes, the buffer does not know which
+        # intents actually changed a row
+        Recipe.objects.filter(pk__in=touched).update(like_count=actual_like_count(), updated_at=timezone.now())
+    for pk in touched:
+        invalidate_recipe(pk)
+    return len(latest)
+
+
+# Function to flush buffered like/unlike intents, see recipe.like_buffer
+@shared_task
+def flush_like_buffer(batch_size=5000):
+    # Nothing is buffered without a buffer URL unless write-behind is on, in
+    # which case get_like_buffer refuses the configuration
+    if not settings.LIKE_BUFFER_URL and not settings.LIKE_WRITE_BEHIND:
+        return 0
+    buffer = get_like_buffer()
+    written = 0
+    with buffer.flushing() as acquired:
+        while acquired:
+            intents = buffer.drain(batch_size)
+            if not intents:
+                break
+            written += write_like_intents(latest_intents(intents))
+            # Only written batches leave the buffer
+            buffer.ack()
+    if written:
+        logger.info(f'Task completed: {written} buffered likes written')
+    return written
+
+
+# Function to advance the precomputed trending scores, see recipe.trending
+@shared_task
+def update_trending_scores():
+    moved = update_scores()
+    logger.info(f'Task completed: {moved} trending scores updated')
+    return moved
+
+
+# Function to remove content-addressed files left without references by
+# rolled back saves, see recipe.storage
+@shared_task
+def sweep_orphaned_media():
+    if not isinstance(default_storage, ContentAddressedStorage):
+        return 0
+    removed = default_storage.sweep_orphans()
+    logger.info(f'Task completed: {removed} orphaned media files removed')
+    return removed
+
+
+# Function to delete expired refresh tokens and blacklist entries, then
+# rebuild the blacklist filter without them, see users.blacklist
+@shared_task
+def prune_token_blacklist(batch_size=1000):
+    pruned = prune_expired_tokens(batch_size)
+    if settings.BLACKLIST_FILTER:
+        rebuild_blacklist_filter()
+    logger.info(f'Task completed: {pruned} expired tokens pruned')
+    return pruned
+
+
+# Function to build the blacklist filter when it is missing, so token
+# refreshes never build it themselves, see users.blacklist
+@shared_task
+def build_token_blacklist_filter():
+    if not settings.BLACKLIST_FILTER:
+        return False
+    built = build_blacklist_filter()
+    if built:
+        logger.info('Task completed: token blacklist filter built')
+    return built
+
+
+# Function to make the fixed-size renditions of an uploaded image, see recipe.renditions
+@shared_task
+def generate_image_renditions(model_label, pk, field_name):
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    field_file = getattr(instance, field_name) if instance is not None else None
+    renditions_field = f'{field_name}_renditions'
+    if not field_file or getattr(instance, renditions_field).get('source') == field_file.name:
+        return None
+    try:
+        renditions = make_renditions(field_file)
+    except (OSError, Image.DecompressionBombError) as e:
+        logger.error(f'Error making renditions of {field_file.name}: {e}')
+        return None
+    changes = {renditions_field: renditions}
+    if model is Recipe:
+        # The renditions are part of the representation
+        changes['updated_at'] = timezone.now()
+    # Only stored if the image was not replaced in the meantime
+    if not model.objects.filter(pk=pk, **{field_name: field_file.name}).update(**changes):
+        delete_renditions(field_file.storage, renditions)
+        return None
+    delete_renditions(field_file.storage, getattr(instance, renditions_field))
+    if model is Recipe:
+        invalidate_recipe(pk)
+    elif model is Profile:
+        # Cached with the user by users.authentication
+        invalidate_user(instance.user_id)
+    logger.info(f'Task completed: renditions of {field_file.name} stored')
+    return renditions
@@ -0,0 +1,101 @@
+from datetime import timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from users.models import Bookmark
+from .models import Recipe, RecipeLike, RecipeTrending
+
+# Scores halve every HALF_LIFE
+HALF_LIFE = timedelta(hours=12)
+LIKE_WEIGHT = 1.0
+BOOKMARK_WEIGHT = 2.0
+# Decayed scores below this drop out of the ranking
+MIN_SCORE = 0.01
+# Recipes changed in this window seed an empty ranking table
+SEED_WINDOW = timedelta(days=7)
+# Rescanned on every run so late commits are not missed; deltas make it harmless
+OVERLAP = timedelta(minutes=1)
+BATCH_SIZE = 1000
+
+
+def decay(age):
+    """
+    Factor applied to a score `age` (a timedelta) old.
+    """
+    return 0.5 ** (max(age.total_seconds(), 0) / HALF_LIFE.total_seconds())
+
+
+def update_scores(now=None):
+    """
+    Advances the ranking table to `now`. Live scores are decayed with one
+    UPDATE, then every recipe changed since the last run adds the likes and
+    bookmarks it gained (or loses the ones it lost) since the counters that
+    run saw, weighted by how long ago it changed. Reruns over the same
+    recipes change nothing. Only recipes entering the table read the likes
+    and bookmarks of the window, so old counters never count as new.
+
+    Returns the number of recipes whose score moved.
+    """
+    now = now or timezone.now()
+    last_run = RecipeTrending.objects.aggregate(last=Max('computed_at'))['last']
+    since = last_run - OVERLAP if last_run else now - SEED_WINDOW
+    changed = (
+        Recipe.objects.filter(updated_at__gte=since).order_by()
+        .values_list('pk', 'like_count', 'bookmark_count', 'updated_at')
+    )
+    moved = 0
+    with transaction.atomic():
+        if last_run is not None:
+            live = RecipeTrending.objects.filter(score__gt=0)
+            live.update(score=F('score') * decay(now - last_run), computed_at=now)
+            live.filter(score__lt=MIN_SCORE).update(score=0)
+        rows = changed.iterator(chunk_size=BATCH_SIZE)
+        while True:
+            batch = list(islice(rows, BATCH_SIZE))
+            if not batch:
+                break
+            moved += _apply_deltas(batch, now, since)
+    return moved
+
+
+def _recent_activity(pks, since, now):
+    """
+    Decayed weight of the likes and bookmarks the recipes `pks` got since
+    `since`, read from their timestamps. Scores recipes entering the table,
+    whose counters also hold all their older activity.
+    """
+    scores = dict.fromkeys(pks, 0.0)
+    for model, weight in ((RecipeLike, LIKE_WEIGHT), (Bookmark, BOOKMARK_WEIGHT)):
+        created = model.objects.filter(recipe_id__in=pks, created__gte=since).values_list('recipe_id', 'created')
+        for pk, at in created.iterator(chunk_size=BATCH_SIZE):
+            scores[pk] += weight * decay(now - at)
+    return scores
+
+
+def _apply_deltas(rows, now, since):
+    seen = RecipeTrending.objects.in_bulk([pk for pk, *counters in rows])
+    recent = _recent_activity([pk for pk, *counters in rows if pk not in seen], since, now)
+    created, updated = [], []
+    for pk, like_count, bookmark_count, updated_at in rows:
+        entry = seen.get(pk)
+        if entry is None:
+            # The current counters are the baseline of later runs
+            if recent[pk] >= MIN_SCORE:
+                created.append(RecipeTrending(recipe_id=pk, score=recent[pk], like_count=like_count,
+                                              bookmark_count=bookmark_count, computed_at=now))
+            continue
+        delta = (LIKE_WEIGHT * (like_count - entry.like_count)
+                 + BOOKMARK_WEIGHT * (bookmark_count - entry.bookmark_count))
+        if not delta:
+            continue
+        updated.append(entry)
+        score = entry.score + delta * decay(now - updated_at)
+        entry.score = score if score >= MIN_SCORE else 0
+        entry.like_count, entry.bookmark_count = like_count, bookmark_count
+        entry.computed_at = now
+    RecipeTrending.objects.bulk_create(created)
+    RecipeTrending.objects.bulk_update(updated, ['score', 'like_count', 'bookmark_count', 'computed_at'])
+    return len(created) + len(updated)
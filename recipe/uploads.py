@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image
+from rest_framework import serializers, status, views
+from rest_framework.exceptions import APIException
+
+# Formats accepted for recipe pictures and avatars
+ALLOWED_IMAGE_FORMATS = frozenset(('JPEG', 'PNG', 'WEBP', 'GIF'))
+# Largest accepted image, in pixels (width * height)
+MAX_IMAGE_PIXELS = 50_000_000
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'The uploaded file is too large.'
+    default_code = 'upload_too_large'
+
+
+class UploadSizeExceeded(RequestDataTooBig):
+    """
+    Raised by `MaxUploadSizeHandler`. Outside of DRF views (admin) Django
+    answers it with a 400 like any oversized request body, API views answer
+    `UploadTooLarge` instead (see `exception_handler`).
+    """
+
+
+def exception_handler(exc, context):
+    """
+    DRF's exception handler, answering uploads over `MAX_UPLOAD_SIZE` with
+    a 413.
+    """
+    if isinstance(exc, UploadSizeExceeded):
+        exc = UploadTooLarge()
+    return views.exception_handler(exc, context)
+
+
+class MaxUploadSizeHandler(FileUploadHandler):
+    """
+    First of the `FILE_UPLOAD_HANDLERS`: counts the bytes of every uploaded
+    file as it streams past and aborts the request once one goes over
+    `MAX_UPLOAD_SIZE`. The chunks are handed on unchanged.
+    """
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # One file plus the regular form fields, rejected before reading anything
+        if content_length > settings.MAX_UPLOAD_SIZE + (settings.DATA_UPLOAD_MAX_MEMORY_SIZE or 0):
+            raise UploadSizeExceeded()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.MAX_UPLOAD_SIZE:
+            raise UploadSizeExceeded()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def validate_image(upload):
+    """
+    Checks an uploaded image from its header: Pillow reads the format and
+    size, and `verify` walks the file structure without decoding pixels.
+    Raises a `ValidationError` for anything that is not an acceptable image.
+    """
+    try:
+        upload.seek(0)
+        with Image.open(upload) as image:
+            image_format, (width, height) = image.format, image.size
+            if image_format not in ALLOWED_IMAGE_FORMATS:
+                raise serializers.ValidationError(f'Unsupported image format {image_format}.')
+            if width * height > MAX_IMAGE_PIXELS:
+                raise serializers.ValidationError(f'Images may have at most {MAX_IMAGE_PIXELS} pixels.')
+            image.verify()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        raise serializers.ValidationError(serializers.ImageField.default_error_messages['invalid_image'])
+    finally:
+        upload.seek(0)
+    return Image.MIME.get(image_format)
+
+
+class HeaderValidatedImageField(serializers.ImageField):
+    """
+    `ImageField` validated by `validate_image` instead of Django's form field,
+    which copies in-memory uploads into a second buffer.
+    """
+    def to_internal_value(self, data):
+        upload = serializers.FileField.to_internal_value(self, data)
+        content_type = validate_image(upload)
+        if content_type:
+            upload.content_type = content_type
+        return upload
@@ -1,5 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .async_views import async_urls
+from .cache import alookup_detail, alookup_list
 from .views import RecipeViewSet, RecipeLikeViewSet
 
 app_name = 'recipe'
@@ -8,10 +10,25 @@ router = DefaultRouter()
 # APIView is replaced by ViewSet here
 router.register(r'', RecipeViewSet, basename='recipe')
 
-urlpatterns = [
-    path('', include(router.urls)),
-    # This url is not necessary, just added so that application using `/create` api does not break
-    path('create/', RecipeViewSet.as_view({'post': 'create_recipe'}), name='recipe-create'),
-    # Api for likes dislikes
-    path('<int:pk>/like/', RecipeLikeViewSet.as_view({'post': 'like', 'delete': 'unlike'}), name='recipe-like'),
-]
+
+def recipe_urls(router_urls):
+    return [
+        # Batch likes, before the router so `likes/` is not taken for a recipe id
+        path('likes/', RecipeLikeViewSet.as_view({'post': 'like_many', 'delete': 'unlike_many'}), name='recipe-likes'),
+        path('', include(router_urls)),
+        # This url is not necessary, just added so that application using `/create` api does not break
+        path('create/', RecipeViewSet.as_view({'post': 'create_recipe'}), name='recipe-create'),
+        # Api for likes dislikes
+        path('<int:pk>/like/', RecipeLikeViewSet.as_view({'post': 'like', 'delete': 'unlike'}), name='recipe-like'),
+    ]
+
+
+urlpatterns = recipe_urls(router.urls)
+
+# Served by config.asgi only (config.asgi_urls): list, detail and trending
+# reads go through the async fronts of recipe.async_views
+async_urlpatterns = recipe_urls(async_urls(router.urls, {
+    'recipe-list': alookup_list,
+    'recipe-detail': alookup_detail,
+    'recipe-trending': None,
+}))
@@ -1,32 +1,187 @@
+from django.conf import settings
+from django.db.models import F
+from django.utils.cache import patch_vary_headers
+from django.views import static
 from rest_framework import viewsets, status
-from rest_framework.permissions import AllowAny, IsAuthenticated
-from django.shortcuts import get_object_or_404
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from .models import Recipe, RecipeLike
-from .serializers import RecipeSerializer
+from rest_framework.exceptions import NotFound
+from rest_framework.settings import api_settings
+from .models import Recipe
+from .serializers import (
+    RecipeRowSerializer, RecipeSerializer, add_viewer_flags, requested_fields, viewer_fields,
+)
+from .pagination import OptInCursorPaginationMixin, TrendingCursorPagination
 from .permissions import IsAuthorOrReadOnly
+from .filters import RecipeSearchFilter
+from .ingredients import normalize_ingredient
+from . import cache as recipe_cache
+from .bulk import MAX_BULK_ITEMS, save_recipes
+from .likes import MAX_BATCH_LIKES, set_likes
+from .like_buffer import get_like_buffer
+from .conditional import not_modified, recipe_etag, set_validators
+from .storage import IMMUTABLE_CACHE_CONTROL, is_content_addressed
 
 # It now uses viewsets instead of APIView
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(OptInCursorPaginationMixin, viewsets.ModelViewSet):
     """
     Recipe ViewSet for viewing, creating, updating, and deleting recipes.
+    The list supports keyset pagination with `?pagination=cursor` and
+    full-text search with `?q=`, though not both at once. Reads can be
+    trimmed with `?fields=` or `?omit=`.
     """
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
+    filter_backends = [*api_settings.DEFAULT_FILTER_BACKENDS, RecipeSearchFilter]
+    # Search results keep their relevance order
+    ranking_query_params = (RecipeSearchFilter.search_param,)
+
+    def get_queryset(self):
+        # Only load the relations and columns of the requested fields
+        fields = requested_fields(self.request, self.get_serializer_class().Meta.fields)
+        return super().get_queryset().for_fields(fields)
 
     def get_permissions(self):
-        if self.action in ['list', "retrieve"]:
+        if self.action in ['list', "retrieve", 'cook_with', 'trending']:
             return [AllowAny()]
-        elif self.action in ['create', "create_recipe"]:
+        elif self.action in ['create', "create_recipe", 'bulk']:
             return [IsAuthenticated()]
         elif self.action in ['update', 'partial_update', 'destroy']:
             return [IsAuthorOrReadOnly()]
         return super().get_permissions()
 
+    # List and detail responses are cached with their validators, so repeated
+    # and conditional reads are answered without touching the database.
+    # See recipe.cache for invalidation and recipe.conditional for ETags.
+    def list(self, request, *args, **kwargs):
+        key = recipe_cache.list_key(request)
+        entry = recipe_cache.lookup(key)
+        if entry is None:
+            # Rows are plain tuples rendered by the compiled RecipeRowSerializer
+            serializer = RecipeRowSerializer(
+                requested_fields(request, RecipeSerializer.Meta.fields), request=request)
+            queryset = serializer.rows(self.filter_queryset(self.get_queryset()))
+            page = self.paginate_queryset(queryset)
+            recipes = page if page is not None else list(queryset)
+            rows = [(r.id, r.updated_at, r.like_count, r.bookmark_count) for r in recipes]
+            envelope = self.paginator.get_paginated_response([]).data if page is not None else {}
+            validators = {'etag': recipe_etag(rows, *envelope.items())}
+            response = self.shared_not_modified(request, validators)
+            if response is not None:
+                return response
+            data = serializer.to_representation(recipes)
+            if page is not None:
+                data = self.get_paginated_response(data).data
+            entry = {'validators': validators, 'data': data}
+            recipe_cache.store(key, entry)
+        return self.cached_response(request, entry)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = recipe_cache.recipe_pk(kwargs['pk'])
+        if pk is None:
+            raise NotFound()
+        key = recipe_cache.detail_key(request, pk)
+        entry = recipe_cache.lookup(key)
+        if entry is None:
+            # Only the validator columns are read before answering a 304
+            row = get_object_or_404(
+                Recipe.objects.values_list('pk', 'updated_at', 'like_count', 'bookmark_count'),
+                pk=pk)
+            validators = {'etag': recipe_etag([row]), 'last_modified': int(row[1].timestamp())}
+            response = self.shared_not_modified(request, validators)
+            if response is not None:
+                return response
+            # Without the viewer flags, which cached_response adds once
+            context = {**self.get_serializer_context(), 'shared': True}
+            data = self.get_serializer_class()(self.get_object(), context=context).data
+            entry = {'validators': validators, 'data': data}
+            recipe_cache.store(key, entry)
+        return self.cached_response(request, entry)
+
+    # Cached entries are shared by every viewer. The `is_liked` and
+    # `is_bookmarked` flags of an authenticated viewer are added on the way
+    # out, with two queries per page, and their values join the ETag.
+    def cached_response(self, request, entry):
+        data, validators = entry['data'], entry['validators']
+        fields = viewer_fields(request)
+        if fields:
+            data, validators = self.personalize(data, validators, request.user, fields)
+        response = not_modified(request, validators)
+        if response is None:
+            response = Response(data)
+        patch_vary_headers(response, ('Authorization', 'Cookie'))
+        return set_validators(response, validators)
+
+    def shared_not_modified(self, request, validators):
+        # Personalized responses are only compared with their own validators
+        if viewer_fields(request):
+            return None
+        return not_modified(request, validators)
+
+    def personalize(self, data, validators, user, fields):
+        if isinstance(data, list):
+            data = items = add_viewer_flags(data, user, fields)
+        elif 'results' in data:
+            items = add_viewer_flags(data['results'], user, fields)
+            data = {**data, 'results': items}
+        else:
+            items = add_viewer_flags([data], user, fields)
+            data = items[0]
+        flags = [(item['id'], *[item[name] for name in fields]) for item in items]
+        return data, {**validators, 'etag': recipe_etag([], validators['etag'], *flags)}
+
+    @action(detail=False, methods=['get'], url_path='cache-stats', permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        return Response(recipe_cache.get_stats())
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    # Recipes that can be cooked with `?ingredients=egg,flour`, best coverage first
+    @action(detail=False, methods=['get'], url_path='cook-with')
+    def cook_with(self, request):
+        names = {normalize_ingredient(name) for name in request.query_params.get('ingredients', '').split(',')}
+        names.discard('')
+        if not names:
+            return Response({"detail": "At least one ingredient is required"}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = self.get_queryset().ranked_by_coverage(names)
+        page = self.paginate_queryset(queryset)
+        recipes = page if page is not None else queryset
+        data = self.get_serializer(recipes, many=True).data
+        for item, recipe in zip(data, recipes):
+            item['matched_ingredients'] = recipe.matched_ingredients
+            item['total_ingredients'] = recipe.total_ingredients
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    # Recipes ranked by the precomputed, time-decayed score of recent likes and
+    # bookmarks, see recipe.trending. Pages are read in index order with a
+    # keyset on (score, id), so no page counts or skips the ranking.
+    @action(detail=False, methods=['get'], url_path='trending')
+    def trending(self, request):
+        queryset = self.get_queryset().filter(trending__score__gt=0).annotate(trending_score=F('trending__score'))
+        paginator = TrendingCursorPagination()
+        recipes = paginator.paginate_queryset(queryset, request, view=self)
+        data = self.get_serializer(recipes, many=True).data
+        for item, recipe in zip(data, recipes):
+            item['trending_score'] = round(recipe.trending_score, 4)
+        return paginator.get_paginated_response(data)
+
+    # Create and update many recipes at once, see recipe.bulk
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response({"detail": "A non-empty list of recipes is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > MAX_BULK_ITEMS:
+            return Response({"detail": f"At most {MAX_BULK_ITEMS} recipes per request"}, status=status.HTTP_400_BAD_REQUEST)
+        results = save_recipes(items, request.user, self.get_serializer_context())
+        failed = any('errors' in result for result in results)
+        return Response({'results': results}, status=status.HTTP_207_MULTI_STATUS if failed else status.HTTP_200_OK)
+
     # This url is not necessary, just added so that application using `/create` api does not break
     @action(detail=False, methods=['post'], url_path='create', permission_classes=[IsAuthenticated])
     def create_recipe(self, request):
@@ -42,19 +197,56 @@ class RecipeLikeViewSet(viewsets.ViewSet):
     """
     Like, Dislike a recipe
     """
+    permission_classes = [IsAuthenticated]
+
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated], url_path='like')
     def like(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        like, created = RecipeLike.objects.get_or_create(user=request.user, recipe=recipe)
-        if created:
-            return Response(status=status.HTTP_201_CREATED)
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+        return self.set_like(request, int(pk), liked=True)
 
     @action(detail=True, methods=['delete'], permission_classes=[IsAuthenticated], url_path='like')
     def unlike(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        like = RecipeLike.objects.filter(user=request.user, recipe=recipe)
-        if like.exists():
-            like.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response(status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return self.set_like(request, int(pk), liked=False)
+
+    # Likes are written with one conflict-tolerant statement, see recipe.likes,
+    # or buffered and written later in write-behind mode, see recipe.like_buffer
+    def set_like(self, request, pk, liked):
+        if settings.LIKE_WRITE_BEHIND:
+            get_like_buffer().push(request.user.pk, pk, liked)
+            return Response({'recipe': pk, 'liked': liked}, status=status.HTTP_202_ACCEPTED)
+        result = set_likes(request.user, [pk], liked)
+        if pk not in result:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        if result[pk]:
+            return Response(status=status.HTTP_201_CREATED if liked else status.HTTP_204_NO_CONTENT)
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    # Like or unlike many recipes with `{"ids": [...]}`
+    def like_many(self, request):
+        return self.set_many_likes(request, liked=True)
+
+    def unlike_many(self, request):
+        return self.set_many_likes(request, liked=False)
+
+    def set_many_likes(self, request, liked):
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        # bool is an int subclass, but true and false are not recipe ids
+        if not isinstance(ids, list) or not ids or not all(
+                isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+            return Response({"detail": "A non-empty list of recipe ids is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > MAX_BATCH_LIKES:
+            return Response({"detail": f"At most {MAX_BATCH_LIKES} recipe ids per request"}, status=status.HTTP_400_BAD_REQUEST)
+        result = set_likes(request.user, ids, liked)
+        return Response({
+            'changed': [pk for pk in ids if result.get(pk)],
+            'unchanged': [pk for pk in ids if result.get(pk) is False],
+            'not_found': [pk for pk in ids if pk not in result],
+        }, status=status.HTTP_200_OK)
+
+
+# Serves media files, content-addressed ones (see recipe.storage) with
+# a one-year immutable lifetime
+def serve_media(request, path, document_root=None, show_indexes=False):
+    response = static.serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    if is_content_addressed(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
@@ -1,8 +1,16 @@
 # This file is for functions that are not covered in api
 
 import pytest
-from recipe.models import get_default_recipe_category
+from datetime import timedelta
+from django.core import mail
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from recipe import tasks
+from recipe.models import Recipe, RecipeCategory, RecipeLike, get_default_recipe_category
+from users import blacklist
 from users.models import CustomUser
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
 
 # create_user
 @pytest.mark.django_db
@@ -28,4 +36,121 @@ def test_create_superuser():
 @pytest.mark.django_db
 def test_get_default_recipe_category():
     response = get_default_recipe_category()
-    assert response.name == "Others"
\ No newline at end of file
+    assert response.name == "Others"
+
+# recipe.tasks.send_daily_notifications
+@pytest.mark.django_db
+def test_send_daily_notifications(monkeypatch, django_assert_max_num_queries):
+    category = RecipeCategory.objects.create(name='category1')
+    authors = [CustomUser.objects.create_user(username=f'author{i}', email=f'author{i}@example.com',
+                                              password='testpassword') for i in range(3)]
+    fan = CustomUser.objects.create_user(username='fan', email='fan@example.com', password='testpassword')
+    for author, total in zip(authors, (2, 1, 0)):
+        for i in range(total):
+            recipe = Recipe.objects.create(author=author, category=category, title='Recipe', desc='desc',
+                                           cook_time='01:00:00', ingredients='item', procedure='procedure')
+            RecipeLike.objects.create(user=fan, recipe=recipe)
+    # Likes older than a day and likes given (not received) are not counted
+    old = RecipeLike.objects.create(user=authors[0], recipe=recipe)
+    RecipeLike.objects.filter(pk=old.pk).update(created=timezone.now() - timedelta(days=2))
+
+    chunks = []
+    monkeypatch.setattr(tasks, 'NOTIFICATION_CHUNK_SIZE', 1)
+    monkeypatch.setattr(tasks.send_email_batch, 'delay', chunks.append)
+    with django_assert_max_num_queries(1):
+        tasks.send_daily_notifications()
+    assert sorted(chunk[0]['to'] for chunk in chunks) == [['author0@example.com'], ['author1@example.com']]
+
+    for chunk in chunks:
+        tasks.send_email_batch(chunk)
+    assert sorted(message.to[0] for message in mail.outbox) == ['author0@example.com', 'author1@example.com']
+    assert any('2 new likes' in message.body for message in mail.outbox)
+
+
+# send_email_batch
+def test_send_email_batch(settings, monkeypatch):
+    settings.EMAIL_BATCH_RATE_PER_SECOND = 0
+    connections, attempts = [], []
+    get_connection = tasks.get_connection
+
+    # One connection per run; the first delivery to flaky@ fails
+    def tracked_connection():
+        connection = get_connection()
+        connections.append(connection)
+        send_messages = connection.send_messages
+
+        def flaky_send(messages):
+            attempts.append(messages[0].to[0])
+            if attempts.count('flaky@example.com') == 1 and messages[0].to == ['flaky@example.com']:
+                raise ConnectionError('connection reset')
+            return send_messages(messages)
+        connection.send_messages = flaky_send
+        return connection
+    monkeypatch.setattr(tasks, 'get_connection', tracked_connection)
+
+    recipients = ['one@example.com', 'flaky@example.com', 'two@example.com']
+    messages = [{'subject': 'Hi', 'body': 'Hello', 'to': [recipient]} for recipient in recipients]
+    result = tasks.send_email_batch.apply(args=[messages])
+    # Only the failed message is retried, over a new connection, and the
+    # counts cover every attempt
+    assert result.get() == {'sent': 3, 'failed': 0}
+    assert attempts == [*recipients, 'flaky@example.com']
+    assert len(connections) == 2
+    assert sorted(message.to[0] for message in mail.outbox) == sorted(recipients)
+
+    # A connection that cannot be opened retries the whole batch
+    opened = []
+
+    def unreachable_connection():
+        connection = get_connection()
+        open_connection = connection.open
+
+        def flaky_open():
+            opened.append(connection)
+            if len(opened) == 1:
+                raise OSError('connection refused')
+            return open_connection()
+        connection.open = flaky_open
+        return connection
+    monkeypatch.setattr(tasks, 'get_connection', unreachable_connection)
+    assert tasks.send_email_batch.apply(args=[messages]).get() == {'sent': 3, 'failed': 0}
+    assert len(opened) == 2
+
+    # Messages are paced to the configured rate
+    settings.EMAIL_BATCH_RATE_PER_SECOND = 4
+    sleeps = []
+    monkeypatch.setattr(tasks.time, 'sleep', sleeps.append)
+    tasks.send_email_batch.apply(args=[messages])
+    assert sleeps == [0.25, 0.25]
+
+
+@pytest.mark.django_db
+def test_prune_token_blacklist(settings, monkeypatch):
+    settings.BLACKLIST_FILTER = True
+    settings.BLACKLIST_FILTER_URL = blacklist.MEMORY_URL
+    monkeypatch.setattr(blacklist, '_filter', blacklist.InMemoryBlacklistFilter())
+    now = timezone.now()
+    tokens = [
+        OutstandingToken.objects.create(jti=f'jti-{i}', token='token', expires_at=now + timedelta(days=days))
+        for i, days in enumerate((-2, -1, 1, 2, -3))
+    ]
+    for token in tokens[1:4]:
+        BlacklistedToken.objects.create(token=token)
+    assert blacklist.get_blacklist_filter().might_contain('jti-1') is None
+
+    with CaptureQueriesContext(connection) as queries:
+        assert tasks.prune_token_blacklist(batch_size=2) == 3
+    # Only expired tokens are read
+    scans = [q['sql'] for q in queries if 'FROM "token_blacklist_outstandingtoken"' in q['sql'] and 'LIMIT' in q['sql']]
+    assert scans and all('"expires_at" <=' in sql for sql in scans)
+    assert sorted(OutstandingToken.objects.values_list('jti', flat=True)) == ['jti-2', 'jti-3']
+    assert sorted(BlacklistedToken.objects.values_list('token__jti', flat=True)) == ['jti-2', 'jti-3']
+    # Ids added since the last rebuild survive the next one, in case their
+    # rows commit after it read the table; the one after keeps only the
+    # remaining blacklisted tokens
+    blacklist_filter = blacklist.get_blacklist_filter()
+    blacklist_filter.add('jti-late')
+    assert blacklist.rebuild_blacklist_filter()
+    assert blacklist_filter.might_contain('jti-late')
+    assert blacklist_filter.might_contain('jti-2') and blacklist_filter.might_contain('jti-3')
+    assert not blacklist_filter.might_contain('jti-1')
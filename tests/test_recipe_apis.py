@@ -3,13 +3,51 @@
 import pytest
 from rest_framework import status
 from rest_framework.test import APIClient
-from django.urls import reverse
-from recipe.models import Recipe, RecipeCategory
+from django.test import Client
+from django.urls import resolve, reverse
+from recipe.models import MediaBlob, Recipe, RecipeCategory, RecipeLike, RecipeTrending
+from recipe.storage import IMMUTABLE_CACHE_CONTROL
+from recipe.views import serve_media
+from recipe import async_views
+from recipe import cache as recipe_cache
+import asyncio
+import threading
+from unittest.mock import Mock
+from recipe.tasks import (
+    flush_like_buffer, generate_image_renditions, reconcile_recipe_counters, sweep_orphaned_media, update_trending_scores,
+)
+from recipe.trending import HALF_LIFE, update_scores
+from recipe.like_buffer import MEMORY_URL, InMemoryLikeBuffer, get_like_buffer
+from recipe import bulk as recipe_bulk
+from recipe import tasks as recipe_tasks
+from recipe.search import postgres_backend as postgres_search_backend
+from recipe.serializers import RecipeRowSerializer, RecipeSerializer
 from users.models import CustomUser
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
 from PIL import Image
 import io
+from datetime import timedelta
 from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.cache import cache
+from django.utils import timezone
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, connection, transaction
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresDatabaseWrapper
+from django.test.utils import CaptureQueriesContext
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+@pytest.fixture(autouse=True)
+def recipe_reads_on_test_thread(settings):
+    # The async reads' thread pool would not see the test transaction
+    settings.RECIPE_READ_WORKERS = 0
 
 @pytest.fixture
 def api_client():
@@ -72,8 +110,7 @@ def test_post_recipe(auth_client, category):
     response = auth_client.post(reverse('recipe:recipe-list'), payload, format='multipart')
     assert response.status_code == status.HTTP_201_CREATED
     assert response.data["category_name"] == category.name
-    avatar_path = response.data['picture'].split('/')[-1]
-    full_file_path = f'uploads/{avatar_path}'
+    full_file_path = response.data['picture'].split('/media/', 1)[-1]
     if default_storage.exists(full_file_path):
         default_storage.delete(full_file_path)
 
@@ -107,8 +144,7 @@ def test_put_recipe(auth_client, recipe, category):
     assert response.status_code == status.HTTP_200_OK
     recipe.refresh_from_db()
     assert recipe.title == 'Updated Recipe'
-    avatar_path = response.data['picture'].split('/')[-1]
-    full_file_path = f'uploads/{avatar_path}'
+    full_file_path = response.data['picture'].split('/media/', 1)[-1]
     if default_storage.exists(full_file_path):
         default_storage.delete(full_file_path)
 
@@ -134,6 +170,8 @@ def test_post_recipe_like(auth_client, recipe):
     response = auth_client.post(reverse('recipe:recipe-like', args=[recipe.id]))
     assert response.status_code == status.HTTP_201_CREATED
     assert recipe.get_total_number_of_likes() == 1
+    recipe.refresh_from_db()
+    assert recipe.like_count == 1
 
 # POST /api/recipe/{id}/like/ - Fail
 @pytest.mark.django_db
@@ -150,6 +188,8 @@ def test_delete_recipe_like(auth_client, recipe):
     response = auth_client.delete(reverse('recipe:recipe-like', kwargs={'pk': recipe.id}))
     assert response.status_code == status.HTTP_204_NO_CONTENT
     assert recipe.get_total_number_of_likes() == 0
+    recipe.refresh_from_db()
+    assert recipe.like_count == 0
 
 # DELETE /api/recipe/{id}/like/ - Failure
 @pytest.mark.django_db
@@ -178,8 +218,7 @@ def test_post_create_recipe(auth_client, category):
     response = auth_client.post(reverse('recipe:recipe-create'), payload, format='multipart')
     assert response.status_code == status.HTTP_201_CREATED
     assert response.data["category_name"] == category.name
-    avatar_path = response.data['picture'].split('/')[-1]
-    full_file_path = f'uploads/{avatar_path}'
+    full_file_path = response.data['picture'].split('/media/', 1)[-1]
     if default_storage.exists(full_file_path):
         default_storage.delete(full_file_path)
 
@@ -197,3 +236,759 @@ def test_post_create_recipe_fail(auth_client, category):
     }
     response = auth_client.post(reverse('recipe:recipe-create'), payload, format='multipart')
     assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+# GET /api/recipe/ - Query count does not grow with the page size
+@pytest.mark.django_db
+def test_get_recipe_list_query_count(api_client, monkeypatch, user, category):
+    monkeypatch.setattr(PageNumberPagination, 'page_size', 1000)
+
+    def count_list_queries(total):
+        Recipe.objects.all().delete()
+        Recipe.objects.bulk_create([
+            Recipe(author=user, category=category, title=f'Recipe {i}', desc='desc',
+                   cook_time='01:00:00', ingredients='item1', procedure='procedure1',
+                   like_count=1, bookmark_count=1)
+            for i in range(total)
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(reverse('recipe:recipe-list'))
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['results']) == total
+        assert all(item['total_number_of_likes'] == 1 for item in response.data['results'])
+        assert all(item['total_number_of_bookmarks'] == 1 for item in response.data['results'])
+        return len(queries)
+
+    assert count_list_queries(10) == count_list_queries(100)
+
+# recipe.tasks.reconcile_recipe_counters
+@pytest.mark.django_db
+def test_reconcile_recipe_counters(user, recipe):
+    RecipeLike.objects.create(user=user, recipe=recipe)
+    user.profile.bookmarks.add(recipe)
+    Recipe.objects.filter(pk=recipe.pk).update(like_count=7, bookmark_count=0)
+    assert reconcile_recipe_counters(batch_size=1) == 1
+    recipe.refresh_from_db()
+    assert (recipe.like_count, recipe.bookmark_count) == (1, 1)
+    assert reconcile_recipe_counters() == 0
+
+# manage.py reconcile_recipe_counters
+@pytest.mark.django_db
+def test_reconcile_recipe_counters_command(recipe):
+    Recipe.objects.filter(pk=recipe.pk).update(like_count=3)
+    out = io.StringIO()
+    call_command('reconcile_recipe_counters', '--batch-size', '10', stdout=out)
+    assert '1 recipe counters reconciled' in out.getvalue()
+    recipe.refresh_from_db()
+    assert recipe.like_count == 0
+
+# GET /api/recipe/?pagination=cursor
+@pytest.mark.django_db
+def test_get_recipe_list_cursor_pagination(api_client, user, category):
+    Recipe.objects.bulk_create([
+        Recipe(author=user, category=category, title=f'Recipe {i}', desc='desc',
+               cook_time='01:00:00', ingredients='item1', procedure='procedure1')
+        for i in range(25)
+    ])
+    # Identical timestamps must be broken by id, not skipped or repeated
+    Recipe.objects.update(created_at=Recipe.objects.first().created_at)
+    expected = list(Recipe.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    seen = []
+    url = reverse('recipe:recipe-list') + '?pagination=cursor'
+    while url:
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert 'count' not in response.data
+        assert not any('COUNT(' in q['sql'] or 'OFFSET' in q['sql'] for q in queries)
+        seen += [item['id'] for item in response.data['results']]
+        url = response.data['next']
+    assert seen == expected
+
+    response = api_client.get(reverse('recipe:recipe-list'), {'cursor': 'garbage'})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    # Ranked results are not re-sorted by the cursor
+    response = api_client.get(reverse('recipe:recipe-list'), {'pagination': 'cursor', 'q': 'recipe'})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    response = api_client.get(reverse('recipe:recipe-cook-with'), {'pagination': 'cursor', 'ingredients': 'item1'})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+# GET /api/recipe/?q=
+@pytest.mark.django_db
+def test_search_recipes(api_client, user, category):
+    def create(title, ingredients, procedure='Cook it'):
+        return Recipe.objects.create(author=user, category=category, title=title, desc='Weeknight dinner',
+                                     cook_time='00:30:00', ingredients=ingredients, procedure=procedure)
+
+    curry = create('Chicken curry', 'chicken, onion, garlic')
+    create('Tomato soup', 'tomato, onion, garlic')
+    stew = create('Beef stew', 'beef, carrot', procedure='Add the chicken stock and simmer')
+    url = reverse('recipe:recipe-list')
+
+    response = api_client.get(url, {'q': 'chicken'})
+    assert response.status_code == status.HTTP_200_OK
+    # A match in the title ranks above a match in the procedure
+    assert [item['id'] for item in response.data['results']] == [curry.id, stew.id]
+
+    response = api_client.get(url, {'q': 'onion garlic chicken'})
+    assert [item['id'] for item in response.data['results']] == [curry.id]
+
+    curry.title = 'Paneer curry'
+    curry.ingredients = 'paneer, onion'
+    curry.save()
+    response = api_client.get(url, {'q': 'chicken'})
+    assert [item['id'] for item in response.data['results']] == [stew.id]
+
+    stew.delete()
+    response = api_client.get(url, {'q': 'chicken'})
+    assert response.data['count'] == 0
+
+# recipe.search.PostgresSearchBackend - Generated query
+def test_postgres_search_query():
+    postgres = PostgresDatabaseWrapper({**connection.settings_dict, 'ENGINE': 'django.db.backends.postgresql'})
+    queryset = postgres_search_backend.search(Recipe.objects.for_fields(RecipeSerializer.Meta.fields), 'chicken curry')
+    sql, params = queryset.query.get_compiler(connection=postgres).as_sql()
+    columns, rest = sql.split(' FROM ', 1)
+    # The GIN-indexed vector is matched and ranked, never loaded
+    assert '"recipe_recipe"."search_vector" @@ websearch_to_tsquery(%s::regconfig, %s)' in rest
+    assert 'ts_rank("recipe_recipe"."search_vector", websearch_to_tsquery(%s::regconfig, %s)) AS "rank"' in columns
+    assert columns.count('search_vector') == 1
+    assert rest.endswith('ORDER BY "rank" DESC, "recipe_recipe"."created_at" DESC, "recipe_recipe"."id" DESC')
+    assert params == ('english', 'chicken curry', 'english', 'chicken curry')
+
+# GET /api/recipe/cook-with/
+@pytest.mark.django_db
+def test_cook_with_ingredients(api_client, user, category):
+    def create(title, ingredients):
+        return Recipe.objects.create(author=user, category=category, title=title, desc='desc',
+                                     cook_time='00:30:00', ingredients=ingredients, procedure='procedure')
+
+    omelette = create('Omelette', '3 Eggs\n1 tbsp butter\nSalt to taste')
+    pancakes = create('Pancakes', '2 cups flour, 2 eggs, 1 cup milk, butter')
+    create('Salad', 'lettuce, tomatoes')
+    assert set(omelette.ingredient_index.values_list('name', flat=True)) == {'egg', 'butter', 'salt'}
+
+    # Saves that keep the ingredients leave the index alone
+    omelette.title = 'Cheese omelette'
+    with CaptureQueriesContext(connection) as queries:
+        omelette.save()
+    assert not any('recipe_recipeingredient' in q['sql'] for q in queries)
+    omelette.ingredients = '3 Eggs\nCheese'
+    omelette.save()
+    assert set(omelette.ingredient_index.values_list('name', flat=True)) == {'egg', 'cheese'}
+    omelette.ingredients = '3 Eggs\n1 tbsp butter\nSalt to taste'
+    omelette.save()
+
+    url = reverse('recipe:recipe-cook-with')
+    response = api_client.get(url, {'ingredients': 'egg, butter, flour'})
+    assert response.status_code == status.HTTP_200_OK
+    results = response.data['results']
+    assert [item['id'] for item in results] == [pancakes.id, omelette.id]
+    assert (results[0]['matched_ingredients'], results[0]['total_ingredients']) == (3, 4)
+    assert (results[1]['matched_ingredients'], results[1]['total_ingredients']) == (2, 3)
+
+    response = api_client.get(url, {'ingredients': 'egg, butter, salt'})
+    assert [item['id'] for item in response.data['results']] == [omelette.id, pancakes.id]
+
+    response = api_client.get(url)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+# manage.py index_recipe_ingredients
+@pytest.mark.django_db
+def test_index_recipe_ingredients_command(recipe):
+    recipe.ingredient_index.all().delete()
+    out = io.StringIO()
+    call_command('index_recipe_ingredients', stdout=out)
+    assert '1 recipes indexed' in out.getvalue()
+    assert sorted(recipe.ingredient_index.values_list('name', flat=True)) == ['item1', 'item2']
+
+# GET /api/recipe/ and /api/recipe/{id}/ - Cached responses
+@pytest.mark.django_db
+def test_recipe_response_cache(auth_client, user, recipe):
+    list_url = reverse('recipe:recipe-list')
+    detail_url = reverse('recipe:recipe-detail', args=[recipe.id])
+    # Viewer flags are added per request, see test_recipe_viewer_flags
+    anonymous_client = APIClient()
+
+    def read(url):
+        # Each read is looked up once, returns the data and whether it hit
+        before = recipe_cache.get_stats()
+        response = anonymous_client.get(url)
+        after = recipe_cache.get_stats()
+        assert response.status_code == status.HTTP_200_OK
+        assert after['hits'] + after['misses'] == before['hits'] + before['misses'] + 1
+        return response.data, after['hits'] > before['hits']
+
+    for url in (list_url, detail_url):
+        assert not read(url)[1]
+        with CaptureQueriesContext(connection) as queries:
+            assert read(url)[1]
+        assert len(queries) == 0
+
+    # Likes, bookmarks and edits invalidate both the feed and the recipe
+    auth_client.post(reverse('recipe:recipe-like', args=[recipe.id]))
+    data, hit = read(list_url)
+    assert not hit and data['results'][0]['total_number_of_likes'] == 1
+    data, hit = read(detail_url)
+    assert not hit and data['total_number_of_likes'] == 1
+    auth_client.post(reverse('users:user-bookmark', kwargs={'pk': user.id}), {'id': recipe.id})
+    data, hit = read(detail_url)
+    assert not hit and data['total_number_of_bookmarks'] == 1
+    # Also under a non-canonical id of the recipe
+    padded_url = reverse('recipe:recipe-detail', args=[f'0{recipe.id}'])
+    read(padded_url)
+    assert read(padded_url)[1]
+    auth_client.patch(detail_url, {'title': 'Renamed'}, format='json')
+    assert auth_client.get(list_url).data['results'][0]['title'] == 'Renamed'
+    assert auth_client.get(detail_url).data['title'] == 'Renamed'
+    data, hit = read(padded_url)
+    assert not hit and data['title'] == 'Renamed'
+
+    # So does renaming the author or the category, other saves do not
+    for url in (list_url, detail_url):
+        read(url)
+    user.username = 'renamed'
+    user.save()
+    data, hit = read(list_url)
+    assert not hit and data['results'][0]['username'] == 'renamed'
+    data, hit = read(detail_url)
+    assert not hit and data['username'] == 'renamed'
+    recipe.category.name = 'Renamed category'
+    recipe.category.save()
+    data, hit = read(detail_url)
+    assert not hit and data['category_name'] == 'Renamed category'
+    user.save(update_fields=['last_login'])
+    recipe.category.save()
+    assert read(detail_url)[1]
+
+    # GET /api/recipe/cache-stats/
+    assert auth_client.get(reverse('recipe:recipe-cache-stats')).status_code == status.HTTP_403_FORBIDDEN
+    user.is_staff = True
+    user.save()
+    stats = recipe_cache.get_stats()
+    assert auth_client.get(reverse('recipe:recipe-cache-stats')).data == stats
+    assert stats['hit_ratio'] == round(stats['hits'] / (stats['hits'] + stats['misses']), 4)
+
+# GET /api/recipe/{id}/ and /api/recipe/ - Conditional requests
+@pytest.mark.django_db
+def test_recipe_conditional_get(auth_client, recipe):
+    anonymous_client = APIClient()
+    detail_url = reverse('recipe:recipe-detail', args=[recipe.id])
+    list_url = reverse('recipe:recipe-list')
+    response = anonymous_client.get(detail_url)
+    etag = response['ETag']
+    assert etag.startswith('"')
+    assert 'Last-Modified' in response
+
+    # Served from the validators alone, with only the narrow row read on a cache miss
+    cache.clear()
+    with CaptureQueriesContext(connection) as queries:
+        response = anonymous_client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert not any(query['sql'].startswith('SELECT') and 'picture' in query['sql'] for query in queries)
+    assert 'procedure' not in queries[0]['sql']
+
+    list_etag = anonymous_client.get(list_url)['ETag']
+    assert anonymous_client.get(list_url, HTTP_IF_NONE_MATCH=list_etag).status_code == status.HTTP_304_NOT_MODIFIED
+    cache.clear()
+    assert anonymous_client.get(list_url, HTTP_IF_NONE_MATCH=list_etag).status_code == status.HTTP_304_NOT_MODIFIED
+
+    # A like changes the representation and so both validators
+    auth_client.post(reverse('recipe:recipe-like', args=[recipe.id]))
+    response = anonymous_client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_200_OK
+    assert response['ETag'] != etag
+    assert anonymous_client.get(list_url, HTTP_IF_NONE_MATCH=list_etag).status_code == status.HTTP_200_OK
+
+    # So does renaming the author, which only changes a joined column
+    etag = anonymous_client.get(detail_url)['ETag']
+    list_etag = anonymous_client.get(list_url)['ETag']
+    recipe.author.username = 'renamed'
+    recipe.author.save()
+    response = anonymous_client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['username'] == 'renamed'
+    assert anonymous_client.get(list_url, HTTP_IF_NONE_MATCH=list_etag).status_code == status.HTTP_200_OK
+
+    response = anonymous_client.get(reverse('recipe:recipe-detail', args=['abc']))
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+# GET /api/recipe/?fields= and ?omit=
+@pytest.mark.django_db
+def test_recipe_sparse_fieldsets(api_client, recipe):
+    list_url = reverse('recipe:recipe-list')
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client.get(list_url, {'fields': 'id,title,picture,total_number_of_likes'})
+    assert response.status_code == status.HTTP_200_OK
+    assert set(response.data['results'][0]) == {'id', 'title', 'picture', 'total_number_of_likes'}
+    select = next(q['sql'] for q in queries if 'FROM "recipe_recipe"' in q['sql'] and 'COUNT' not in q['sql'])
+    assert '"procedure"' not in select and '"ingredients"' not in select
+    assert 'JOIN' not in select
+
+    response = api_client.get(reverse('recipe:recipe-detail', args=[recipe.id]), {'omit': 'procedure,ingredients'})
+    assert 'procedure' not in response.data and 'ingredients' not in response.data
+    assert response.data['category_name'] == recipe.category.name
+    # The trimmed detail response is cached apart from the full one
+    response = api_client.get(reverse('recipe:recipe-detail', args=[recipe.id]))
+    assert response.data['procedure'] == recipe.procedure
+
+# recipe.serializers.RecipeRowSerializer
+@pytest.mark.django_db
+def test_recipe_row_serializer_matches_recipe_serializer(recipe, user, category):
+    Recipe.objects.create(author=user, category=category, picture='uploads/photo.jpg', title='With picture',
+                          desc='desc', cook_time='00:45:30', ingredients='egg', procedure='procedure')
+    request = Request(APIRequestFactory().get('/api/recipe/'))
+    queryset = Recipe.objects.all()
+    expected = RecipeSerializer(queryset, many=True, context={'request': request}).data
+
+    serializer = RecipeRowSerializer(RecipeSerializer.Meta.fields, request=request)
+    assert serializer.to_representation(serializer.rows(queryset)) == expected
+    assert [list(item) for item in serializer.to_representation(serializer.rows(queryset))] == \
+        [list(item) for item in expected]
+
+    serializer = RecipeRowSerializer(['id', 'category', 'picture'], request=request)
+    assert serializer.to_representation(serializer.rows(queryset)) == [
+        {'id': item['id'], 'category': item['category'], 'picture': item['picture']} for item in expected
+    ]
+
+# POST /api/recipe/bulk/
+@pytest.mark.django_db
+def test_bulk_recipes(auth_client, user, recipe, category, monkeypatch):
+    other = CustomUser.objects.create_user(username='other', email='other@example.com', password='testpassword')
+    others_recipe = Recipe.objects.create(author=other, category=category, title='Theirs', desc='desc',
+                                          cook_time='01:00:00', ingredients='salt', procedure='procedure')
+
+    def item(title, category_name):
+        return {'title': title, 'desc': 'desc', 'cook_time': '00:20:00', 'ingredients': 'egg, rice',
+                'procedure': 'Fry', 'category': {'name': category_name}}
+
+    payload = [
+        item('Fried rice', category.name),
+        {'title': 'Missing fields'},
+        item('Congee', 'Breakfast'),
+        {'id': recipe.id, 'title': 'Renamed', 'category': {'name': 'Breakfast'}},
+        {'id': others_recipe.id, 'title': 'Hijacked'},
+    ]
+    invalidate_recipes = Mock(wraps=recipe_bulk.invalidate_recipes)
+    monkeypatch.setattr(recipe_bulk, 'invalidate_recipes', invalidate_recipes)
+    with CaptureQueriesContext(connection) as queries:
+        response = auth_client.post(reverse('recipe:recipe-bulk'), payload, format='json')
+    assert response.status_code == status.HTTP_207_MULTI_STATUS
+    # Updated recipes leave the cache together
+    invalidate_recipes.assert_called_once_with([recipe.id])
+    results = response.data['results']
+    assert [result.get('status') for result in results] == ['created', None, 'created', 'updated', None]
+    assert 'category' in results[1]['errors']
+    assert 'id' in results[4]['errors']
+    assert sum('recipe_recipecategory' in q['sql'] and q['sql'].startswith('INSERT') for q in queries) == 1
+
+    assert RecipeCategory.objects.filter(name='Breakfast').count() == 1
+    congee = Recipe.objects.get(pk=results[2]['id'])
+    assert (congee.title, congee.category.name, congee.author) == ('Congee', 'Breakfast', user)
+    assert sorted(congee.ingredient_index.values_list('name', flat=True)) == ['egg', 'rice']
+    recipe.refresh_from_db()
+    assert (recipe.title, recipe.category.name) == ('Renamed', 'Breakfast')
+    others_recipe.refresh_from_db()
+    assert others_recipe.title == 'Theirs'
+
+    response = auth_client.get(reverse('recipe:recipe-list'), {'q': 'congee'})
+    assert [item['id'] for item in response.data['results']] == [congee.id]
+
+    response = auth_client.post(reverse('recipe:recipe-bulk'), [item('Soup', 'Dinner')], format='json')
+    assert response.status_code == status.HTTP_200_OK
+    response = auth_client.post(reverse('recipe:recipe-bulk'), {}, format='json')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+# POST /api/recipe/{id}/like/ - One statement, missing recipe
+@pytest.mark.django_db
+def test_recipe_like_single_statement(auth_client, recipe):
+    url = reverse('recipe:recipe-like', args=[recipe.id])
+    with CaptureQueriesContext(connection) as queries:
+        response = auth_client.post(url)
+    assert response.status_code == status.HTTP_201_CREATED
+    writes = [q['sql'] for q in queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+    assert len(writes) <= 2
+    recipe.refresh_from_db()
+    assert recipe.like_count == 1
+
+    response = auth_client.post(reverse('recipe:recipe-like', args=[recipe.id + 100]))
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    response = auth_client.delete(reverse('recipe:recipe-like', args=[recipe.id + 100]))
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert RecipeLike.objects.count() == 1
+    assert APIClient().post(url).status_code == status.HTTP_401_UNAUTHORIZED
+
+# POST and DELETE /api/recipe/likes/
+@pytest.mark.django_db
+def test_recipe_batch_likes(auth_client, user, recipe, category):
+    second = Recipe.objects.create(author=user, category=category, title='Second', desc='desc',
+                                   cook_time='01:00:00', ingredients='salt', procedure='procedure')
+    url = reverse('recipe:recipe-likes')
+    auth_client.post(reverse('recipe:recipe-like', args=[recipe.id]))
+
+    response = auth_client.post(url, {'ids': [recipe.id, second.id, 9999]}, format='json')
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data == {'changed': [second.id], 'unchanged': [recipe.id], 'not_found': [9999]}
+    assert set(Recipe.objects.values_list('like_count', flat=True)) == {1}
+
+    response = auth_client.delete(url, {'ids': [recipe.id, second.id]}, format='json')
+    assert response.data == {'changed': [recipe.id, second.id], 'unchanged': [], 'not_found': []}
+    assert set(Recipe.objects.values_list('like_count', flat=True)) == {0}
+    assert RecipeLike.objects.count() == 0
+
+    response = auth_client.post(url, {'ids': 'nope'}, format='json')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    response = auth_client.post(url, {'ids': [True]}, format='json')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert RecipeLike.objects.count() == 0
+
+# POST /api/recipe/{id}/like/ - Write-behind mode
+@pytest.mark.django_db
+def test_recipe_like_write_behind(auth_client, settings, monkeypatch, user, recipe, category):
+    settings.LIKE_WRITE_BEHIND = True
+    # Without a buffer shared with the flush task, likes would be lost
+    settings.LIKE_BUFFER_URL = ''
+    with pytest.raises(ImproperlyConfigured):
+        get_like_buffer()
+    settings.LIKE_BUFFER_URL = MEMORY_URL
+    monkeypatch.setattr('recipe.like_buffer._buffer', InMemoryLikeBuffer())
+    second = Recipe.objects.create(author=user, category=category, title='Second', desc='desc',
+                                   cook_time='01:00:00', ingredients='salt', procedure='procedure')
+    RecipeLike.objects.create(user=user, recipe=second)
+    url = reverse('recipe:recipe-like', args=[recipe.id])
+
+    response = auth_client.post(url)
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert response.data == {'recipe': recipe.id, 'liked': True}
+    auth_client.delete(url)
+    auth_client.post(url)
+    auth_client.delete(reverse('recipe:recipe-like', args=[second.id]))
+    auth_client.post(reverse('recipe:recipe-like', args=[9999]))
+    assert RecipeLike.objects.filter(recipe=recipe).count() == 0
+
+    assert flush_like_buffer() == 2
+    assert list(RecipeLike.objects.values_list('recipe_id', flat=True)) == [recipe.id]
+    recipe.refresh_from_db()
+    second.refresh_from_db()
+    assert (recipe.like_count, second.like_count) == (1, 0)
+    assert flush_like_buffer() == 0
+
+    # A failed write leaves its batch for the next flush
+    auth_client.delete(url)
+    write_like_intents = recipe_tasks.write_like_intents
+    monkeypatch.setattr(recipe_tasks, 'write_like_intents', Mock(side_effect=DatabaseError))
+    with pytest.raises(DatabaseError):
+        flush_like_buffer()
+    monkeypatch.setattr(recipe_tasks, 'write_like_intents', write_like_intents)
+    assert flush_like_buffer() == 1
+    assert not RecipeLike.objects.filter(recipe=recipe).exists()
+
+
+# GET /api/recipe/trending/
+@pytest.mark.django_db
+def test_trending_recipes(auth_client, user, recipe, category):
+    second = Recipe.objects.create(author=user, category=category, title='Second', desc='desc',
+                                   cook_time='01:00:00', ingredients='salt', procedure='procedure')
+    Recipe.objects.create(author=user, category=category, title='Quiet', desc='desc',
+                          cook_time='01:00:00', ingredients='salt', procedure='procedure')
+    auth_client.post(reverse('recipe:recipe-like', args=[recipe.id]))
+    auth_client.post(reverse('users:user-bookmark', args=[user.id]), {'id': second.id})
+    url = reverse('recipe:recipe-trending')
+
+    assert update_trending_scores() == 2
+    response = auth_client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    # A bookmark weighs more than a like, recipes without activity are left out
+    assert [(item['id'], item['trending_score']) for item in response.data['results']] == [
+        (second.id, 2.0), (recipe.id, 1.0)]
+
+    # Scores decay with time and only new likes and bookmarks are added
+    later = timezone.now() + HALF_LIFE
+    RecipeLike.objects.create(user=CustomUser.objects.create_user(
+        username='fan', email='fan@example.com', password='testpassword'), recipe=recipe)
+    Recipe.objects.filter(pk=recipe.pk).update(like_count=2, updated_at=later)
+    assert update_scores(later) == 1
+    assert update_scores(later) == 0
+    response = auth_client.get(url)
+    assert [(item['id'], item['trending_score']) for item in response.data['results']] == [
+        (recipe.id, 1.5), (second.id, 1.0)]
+
+    # Pages seek on (score, id) without counting, ties broken by id
+    Recipe.objects.bulk_create([
+        Recipe(author=user, category=category, title=f'Recipe {i}', desc='desc',
+               cook_time='01:00:00', ingredients='salt', procedure='procedure')
+        for i in range(15)
+    ])
+    for i, trending in enumerate(Recipe.objects.filter(trending__isnull=True)):
+        RecipeTrending.objects.create(recipe=trending, score=1.0 + i % 3, computed_at=later)
+    expected = list(Recipe.objects.filter(trending__score__gt=0).order_by('-trending__score', '-id')
+                    .values_list('id', flat=True))
+    seen = []
+    url = reverse('recipe:recipe-trending')
+    while url:
+        with CaptureQueriesContext(connection) as queries:
+            response = auth_client.get(url)
+        assert 'count' not in response.data
+        assert not any('COUNT(' in q['sql'] or 'OFFSET' in q['sql'] for q in queries)
+        seen += [item['id'] for item in response.data['results']]
+        url = response.data['next']
+    assert seen == expected and len(seen) == 18
+
+
+# GET /api/recipe/trending/ - All-time counters are not new activity
+@pytest.mark.django_db
+def test_trending_new_entries(auth_client, user, recipe, category):
+    fresh = Recipe.objects.create(author=user, category=category, title='Fresh', desc='desc',
+                                  cook_time='01:00:00', ingredients='salt', procedure='procedure')
+    # Liked 5000 times long ago, once now
+    Recipe.objects.filter(pk=recipe.pk).update(like_count=4999, bookmark_count=300)
+    auth_client.post(reverse('recipe:recipe-like', args=[recipe.id]))
+    auth_client.post(reverse('recipe:recipe-like', args=[fresh.id]))
+    auth_client.post(reverse('users:user-bookmark', args=[user.id]), {'id': fresh.id})
+
+    assert update_trending_scores() == 2
+    response = auth_client.get(reverse('recipe:recipe-trending'))
+    assert [(item['id'], item['trending_score']) for item in response.data['results']] == [
+        (fresh.id, 3.0), (recipe.id, 1.0)]
+    # The counters are the baseline of the next runs
+    assert RecipeTrending.objects.get(pk=recipe.pk).like_count == 5000
+    assert update_trending_scores() == 0
+
+
+# GET /api/recipe/ and /api/recipe/{id}/ - is_liked and is_bookmarked
+@pytest.mark.django_db
+def test_recipe_viewer_flags(auth_client, user, recipe, category):
+    second = Recipe.objects.create(author=user, category=category, title='Second', desc='desc',
+                                   cook_time='01:00:00', ingredients='salt', procedure='procedure')
+    auth_client.post(reverse('recipe:recipe-like', args=[recipe.id]))
+    auth_client.post(reverse('users:user-bookmark', args=[user.id]), {'id': second.id})
+    list_url = reverse('recipe:recipe-list')
+    detail_url = reverse('recipe:recipe-detail', args=[recipe.id])
+
+    response = auth_client.get(list_url)
+    flags = {item['id']: (item['is_liked'], item['is_bookmarked']) for item in response.data['results']}
+    assert flags == {recipe.id: (True, False), second.id: (False, True)}
+    # A cached page only reads the two sets
+    with CaptureQueriesContext(connection) as queries:
+        cached = auth_client.get(list_url)
+    assert cached.data == response.data
+    assert len(queries) == 2
+    assert 'Authorization' in cached['Vary']
+    assert auth_client.get(list_url, HTTP_IF_NONE_MATCH=cached['ETag']).status_code == status.HTTP_304_NOT_MODIFIED
+
+    # An uncached detail reads the two sets once, for the body and the ETag
+    with CaptureQueriesContext(connection) as queries:
+        detail = auth_client.get(detail_url)
+    assert (detail.data['is_liked'], detail.data['is_bookmarked']) == (True, False)
+    assert sum('recipe_recipelike' in query['sql'] for query in queries) == 1
+    assert 'is_liked' not in auth_client.get(detail_url, {'omit': 'is_liked'}).data
+
+    # Flags are never shared with other viewers, nor through the ETag
+    anonymous = APIClient().get(list_url)
+    assert all('is_liked' not in item for item in anonymous.data['results'])
+    assert anonymous['ETag'] != cached['ETag']
+    other = CustomUser.objects.create_user(username='other', email='other@example.com', password='testpassword')
+    other_client = APIClient()
+    other_client.force_authenticate(user=other)
+    assert not any(item['is_liked'] or item['is_bookmarked'] for item in other_client.get(list_url).data['results'])
+
+    auth_client.delete(reverse('recipe:recipe-like', args=[recipe.id]))
+    assert auth_client.get(detail_url).data['is_liked'] is False
+
+    # Uncached lists fill the flags with the same two queries per page
+    with CaptureQueriesContext(connection) as queries:
+        response = auth_client.get(reverse('recipe:recipe-cook-with'), {'ingredients': 'salt'})
+    assert [item['is_bookmarked'] for item in response.data['results']] == [True]
+    assert sum('recipe_recipelike' in query['sql'] for query in queries) == 1
+
+
+# POST /api/recipe/ - Picture renditions
+@pytest.mark.django_db
+def test_recipe_picture_renditions(auth_client, settings, tmp_path, category, django_capture_on_commit_callbacks):
+    settings.MEDIA_ROOT = str(tmp_path)
+    image = Image.new('RGB', (2000, 1000), color='red')
+    img_byte_arr = io.BytesIO()
+    image.save(img_byte_arr, format='JPEG')
+    picture = SimpleUploadedFile("image.jpg", img_byte_arr.getvalue(), content_type="image/jpeg")
+    payload = {'category.name': category.name, 'title': 'New Recipe', 'desc': 'New description',
+               'cook_time': '01:30:00', 'ingredients': 'Ingredients', 'procedure': 'Procedure', 'picture': picture}
+    with django_capture_on_commit_callbacks() as callbacks:
+        response = auth_client.post(reverse('recipe:recipe-list'), payload, format='multipart')
+    assert len(callbacks) == 1
+    # The original is served until the renditions exist
+    renditions = response.data['picture_renditions']
+    assert renditions['card'] == {'webp': response.data['picture'], 'jpeg': response.data['picture']}
+
+    recipe = Recipe.objects.get(pk=response.data['id'])
+    generate_image_renditions('recipe.Recipe', recipe.pk, 'picture')
+    assert generate_image_renditions('recipe.Recipe', recipe.pk, 'picture') is None
+    detail = auth_client.get(reverse('recipe:recipe-detail', args=[recipe.pk])).data
+    urls = detail['picture_renditions']
+    assert urls['thumbnail']['webp'].startswith('http://testserver/')
+    assert urls['card']['webp'].endswith('.webp')
+    assert auth_client.get(reverse('recipe:recipe-list')).data['results'][0]['picture_renditions'] == urls
+
+    recipe.refresh_from_db()
+    for size, width in (('thumbnail', 160), ('card', 480), ('full', 1280)):
+        for ext, image_format in (('webp', 'WEBP'), ('jpeg', 'JPEG')):
+            with Image.open(tmp_path / recipe.picture_renditions[size][ext]) as rendition:
+                assert (rendition.format, rendition.size) == (image_format, (width, width // 2))
+
+
+# POST /api/recipe/ - Upload size cap and header validation
+@pytest.mark.django_db
+def test_recipe_picture_upload_validation(auth_client, user, settings, tmp_path, category):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.MAX_UPLOAD_SIZE = 50 * 1024
+    payload = {'category.name': category.name, 'title': 'New Recipe', 'desc': 'New description',
+               'cook_time': '01:30:00', 'ingredients': 'Ingredients', 'procedure': 'Procedure'}
+    url = reverse('recipe:recipe-list')
+
+    # Over the cap while streaming, before anything is validated
+    picture = SimpleUploadedFile("image.jpg", bytes(60 * 1024), content_type="image/jpeg")
+    response = auth_client.post(url, {**payload, 'picture': picture}, format='multipart')
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    # Django's 400 for oversized bodies outside of the API, not a 500
+    user.is_staff = user.is_superuser = True
+    user.save()
+    admin_client = Client()
+    admin_client.force_login(user)
+    picture = SimpleUploadedFile("image.jpg", bytes(60 * 1024), content_type="image/jpeg")
+    response = admin_client.post(reverse('admin:recipe_recipe_add'), {**payload, 'picture': picture})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    # Not an image, or not an accepted format
+    picture = SimpleUploadedFile("image.jpg", b'not an image', content_type="image/jpeg")
+    response = auth_client.post(url, {**payload, 'picture': picture}, format='multipart')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert 'picture' in response.data
+    img_byte_arr = io.BytesIO()
+    Image.new('RGB', (10, 10)).save(img_byte_arr, format='BMP')
+    picture = SimpleUploadedFile("image.bmp", img_byte_arr.getvalue(), content_type="image/bmp")
+    response = auth_client.post(url, {**payload, 'picture': picture}, format='multipart')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    # The content type comes from the header, not from the client
+    img_byte_arr = io.BytesIO()
+    Image.new('RGB', (10, 10)).save(img_byte_arr, format='PNG')
+    picture = SimpleUploadedFile("image.jpg", img_byte_arr.getvalue(), content_type="image/jpeg")
+    serializer = RecipeSerializer(data={**payload, 'category': {'name': category.name}, 'picture': picture})
+    assert serializer.is_valid(), serializer.errors
+    assert serializer.validated_data['picture'].content_type == 'image/png'
+
+
+# POST /api/recipe/ - Content-addressed pictures
+@pytest.mark.django_db
+def test_recipe_picture_deduplication(auth_client, settings, monkeypatch, tmp_path, category, django_capture_on_commit_callbacks):
+    settings.MEDIA_ROOT = str(tmp_path)
+    monkeypatch.setattr(generate_image_renditions, 'delay', lambda *args: None)
+    img_byte_arr = io.BytesIO()
+    Image.new('RGB', (100, 100), color='red').save(img_byte_arr, format='JPEG')
+    payload = {'category.name': category.name, 'title': 'New Recipe', 'desc': 'New description',
+               'cook_time': '01:30:00', 'ingredients': 'Ingredients', 'procedure': 'Procedure'}
+    url = reverse('recipe:recipe-list')
+
+    # Identical uploads share one file
+    ids = []
+    for filename in ('one.jpg', 'two.JPG'):
+        picture = SimpleUploadedFile(filename, img_byte_arr.getvalue(), content_type="image/jpeg")
+        ids.append(auth_client.post(url, {**payload, 'picture': picture}, format='multipart').data['id'])
+    first, second = Recipe.objects.filter(pk__in=ids).order_by('pk')
+    name = first.picture.name
+    assert name.startswith('blobs/') and name.endswith('.jpg')
+    assert second.picture.name == name
+    assert MediaBlob.objects.get(name=name).references == 2
+
+    # Served with an immutable lifetime
+    request = APIRequestFactory().get(f'{settings.MEDIA_URL}{name}')
+    response = serve_media(request, name, document_root=settings.MEDIA_ROOT)
+    assert response.status_code == status.HTTP_200_OK
+    assert response['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+
+    # Replacing and deleting drop references after commit, the last one removes the file
+    img_byte_arr = io.BytesIO()
+    Image.new('RGB', (100, 100), color='blue').save(img_byte_arr, format='JPEG')
+    picture = SimpleUploadedFile("three.jpg", img_byte_arr.getvalue(), content_type="image/jpeg")
+    with django_capture_on_commit_callbacks(execute=True):
+        response = auth_client.patch(reverse('recipe:recipe-detail', args=[first.pk]), {'picture': picture}, format='multipart')
+    assert response.status_code == status.HTTP_200_OK
+    assert MediaBlob.objects.get(name=name).references == 1
+    with django_capture_on_commit_callbacks(execute=True):
+        second.delete()
+    assert not MediaBlob.objects.filter(name=name).exists()
+    assert not (tmp_path / name).exists()
+
+    # Saves that keep the picture do not look up the previous one
+    first.refresh_from_db()
+    with CaptureQueriesContext(connection) as queries:
+        first.save()
+    assert not any(query['sql'].startswith('SELECT') and 'picture' in query['sql'] for query in queries)
+
+    # A rolled back save leaves its file without a reference, swept once old
+    with pytest.raises(DatabaseError):
+        with transaction.atomic():
+            orphan = default_storage.save('orphan.jpg', ContentFile(b'orphan'))
+            raise DatabaseError
+    assert (tmp_path / orphan).exists() and not MediaBlob.objects.filter(name=orphan).exists()
+    assert sweep_orphaned_media() == 0
+    assert default_storage.sweep_orphans(grace=timedelta(0)) == 1
+    assert not (tmp_path / orphan).exists()
+    assert (tmp_path / first.picture.name).exists()
+
+
+# GET /api/recipe/ - Async fronts under ASGI only
+def test_async_recipe_reads_urlconf():
+    detail = reverse('recipe:recipe-detail', args=[1])
+    assert not asyncio.iscoroutinefunction(resolve(detail).func)
+    assert asyncio.iscoroutinefunction(resolve(detail, 'config.asgi_urls').func)
+    assert reverse('recipe:recipe-detail', args=[1], urlconf='config.asgi_urls') == detail
+
+
+# GET /api/recipe/ - Async cache hits
+@pytest.mark.django_db
+@pytest.mark.urls('config.asgi_urls')
+def test_async_recipe_reads_cache_hits(api_client, recipe):
+    for url in (reverse('recipe:recipe-list'), reverse('recipe:recipe-detail', args=[recipe.id])):
+        filled = api_client.get(url)
+        assert filled.status_code == status.HTTP_200_OK
+        hits = recipe_cache.get_stats()['hits']
+        with CaptureQueriesContext(connection) as queries:
+            cached = api_client.get(url)
+            not_modified = api_client.get(url, HTTP_IF_NONE_MATCH=filled['ETag'])
+        # Answered on the event loop, the same response the viewset gives
+        assert len(queries) == 0
+        assert recipe_cache.get_stats()['hits'] == hits + 2
+        assert cached.json() == filled.json()
+        for header in ('ETag', 'Vary', 'Allow', 'Content-Type'):
+            assert cached[header] == filled[header]
+        assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+# GET /api/recipe/{id}/ - Async reads on the thread pool
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.urls('config.asgi_urls')
+def test_async_recipe_reads_thread_pool(api_client, settings, monkeypatch, recipe):
+    settings.RECIPE_READ_WORKERS = 2
+    monkeypatch.setattr(async_views, '_executor', None)
+    threads, call_view = [], async_views.call_view
+
+    def record_thread(*args, **kwargs):
+        threads.append(threading.current_thread().name)
+        return call_view(*args, **kwargs)
+    monkeypatch.setattr(async_views, 'call_view', record_thread)
+    response = api_client.get(reverse('recipe:recipe-detail', args=[recipe.id]))
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['title'] == 'Init Recipe'
+    response = api_client.get(reverse('recipe:recipe-trending'))
+    assert response.status_code == status.HTTP_200_OK
+    assert threads and all(name.startswith('recipe-reads') for name in threads)
+    assert async_views.get_read_executor()._max_workers == 2
+
+    # Writes stay off the read pool
+    threads.clear()
+    api_client.force_authenticate(user=recipe.author)
+    response = api_client.patch(reverse('recipe:recipe-detail', args=[recipe.id]), {'title': 'Renamed'}, format='json')
+    assert response.status_code == status.HTTP_200_OK
+    assert len(threads) == 1 and not threads[0].startswith('recipe-reads')
+    assert Recipe.objects.get(pk=recipe.pk).title == 'Renamed'
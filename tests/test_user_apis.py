@@ -1,15 +1,29 @@
 # API test cases for user module
 
+import asyncio
 import pytest
 from rest_framework import status
 from rest_framework.test import APIClient
-from django.urls import reverse
+from django.urls import resolve, reverse
 from users.models import CustomUser
+from users import blacklist, hashing
+from users.serializers import RECENT_BOOKMARKS
+from recipe.tasks import build_token_blacklist_filter, generate_image_renditions
 from recipe.models import Recipe, RecipeCategory
+from recipe.pagination import BookmarkCursorPagination
 from django.core.files.uploadedfile import SimpleUploadedFile
 from PIL import Image
 import io
 from django.core.files.storage import default_storage
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.contrib.auth.signals import user_login_failed
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
 
 @pytest.fixture
 def api_client():
@@ -79,6 +93,9 @@ def test_user_login(api_client, user):
     assert response.status_code == status.HTTP_200_OK
     assert 'access' in response.data["tokens"]
     assert 'refresh' in response.data["tokens"]
+    # Sync view under WSGI, the hashing pool is for config.asgi
+    assert not asyncio.iscoroutinefunction(resolve(url).func)
+    assert asyncio.iscoroutinefunction(resolve(url, 'config.asgi_urls').func)
 
 # POST /api/user/login/ - Faailure
 @pytest.mark.django_db
@@ -184,14 +201,101 @@ def test_create_user_bookmark(auth_client, recipe, user):
     data = {'id': recipe.id}
     response = auth_client.post(url, data)
     assert response.status_code == status.HTTP_200_OK
+    auth_client.post(url, data)
+    recipe.refresh_from_db()
+    assert recipe.bookmark_count == 1
 
 # DELETE /api/user/profile/{id}/bookmarks/
 @pytest.mark.django_db
 def test_delete_user_bookmark(auth_client, user, recipe):
     url = reverse('users:user-bookmark', kwargs={'pk':user.id})
     data = {'id': recipe.id}
+    auth_client.post(url, data)
     response = auth_client.delete(url, data)
     assert response.status_code == status.HTTP_200_OK
+    auth_client.delete(url, data)
+    recipe.refresh_from_db()
+    assert recipe.bookmark_count == 0
+
+# POST, DELETE and GET /api/user/profile/{id}/bookmarks/ - Batches and bookmark order
+@pytest.mark.django_db
+def test_batch_user_bookmarks(auth_client, user, recipe, category, monkeypatch, django_assert_max_num_queries):
+    url = reverse('users:user-bookmark', kwargs={'pk': user.id})
+    recipes = [recipe] + [
+        Recipe.objects.create(author=user, category=category, title=f'Recipe {i}', desc='desc',
+                              cook_time='01:00:00', ingredients='item', procedure='procedure')
+        for i in range(3)
+    ]
+    auth_client.post(url, {'id': recipes[2].id})
+    # One existence read, one insert and one counter update
+    with django_assert_max_num_queries(6):
+        response = auth_client.post(url, {'ids': [r.id for r in recipes] + [9999]}, format='json')
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data == {
+        'changed': [recipes[0].id, recipes[1].id, recipes[3].id],
+        'unchanged': [recipes[2].id],
+        'not_found': [9999],
+    }
+    assert [r.bookmark_count for r in Recipe.objects.filter(pk__in=[r.id for r in recipes])] == [1, 1, 1, 1]
+
+    # Newest bookmark first, ties broken by recipe id
+    response = auth_client.get(url)
+    assert [item['id'] for item in response.data['results']] == [
+        recipes[3].id, recipes[1].id, recipes[0].id, recipes[2].id]
+    monkeypatch.setattr(BookmarkCursorPagination, 'page_size', 2)
+    with django_assert_max_num_queries(5):
+        first = auth_client.get(url, {'pagination': 'cursor'})
+    assert [item['id'] for item in first.data['results']] == [recipes[3].id, recipes[1].id]
+    second = auth_client.get(first.data['next'])
+    assert [item['id'] for item in second.data['results']] == [recipes[0].id, recipes[2].id]
+
+    # Only the columns of the requested fields are read
+    with CaptureQueriesContext(connection) as queries:
+        response = auth_client.get(url, {'fields': 'id,title'})
+    assert set(response.data['results'][0]) == {'id', 'title'}
+    select = next(q['sql'] for q in queries if 'FROM "recipe_recipe"' in q['sql'] and 'COUNT' not in q['sql'])
+    assert '"procedure"' not in select and '"search_vector"' not in select
+    assert 'JOIN "users_customuser"' not in select
+
+    response = auth_client.delete(url, {'ids': [recipes[0].id, recipes[1].id]}, format='json')
+    assert response.data['changed'] == [recipes[0].id, recipes[1].id]
+    assert Recipe.objects.get(pk=recipes[0].id).bookmark_count == 0
+    assert auth_client.get(url).data['count'] == 2
+
+    assert auth_client.post(url, {'id': 9999}).status_code == status.HTTP_404_NOT_FOUND
+    assert auth_client.post(url, {'ids': ['abc']}, format='json').status_code == status.HTTP_400_BAD_REQUEST
+    assert auth_client.post(url, {'ids': []}, format='json').status_code == status.HTTP_400_BAD_REQUEST
+
+# GET /api/user/profile/ and /api/user/profile/{id}/bookmarks/ids/
+@pytest.mark.django_db
+def test_profile_bookmark_ids(auth_client, user, category, django_assert_max_num_queries):
+    recipes = [
+        Recipe.objects.create(author=user, category=category, title=f'Recipe {i}', desc='desc',
+                              cook_time='01:00:00', ingredients='item', procedure='procedure')
+        for i in range(12)
+    ]
+    url = reverse('users:user-bookmark', kwargs={'pk': user.id})
+    for recipe in recipes:
+        auth_client.post(url, {'id': recipe.id})
+
+    response = auth_client.get(reverse('users:user-profile'))
+    assert response.data['bookmark_count'] == 12
+    assert response.data['recent_bookmarks'] == [recipe.id for recipe in recipes[::-1][:RECENT_BOOKMARKS]]
+    assert 'bookmarks' not in response.data
+
+    # Ids only, straight from the through table
+    ids_url = reverse('users:user-bookmark-ids', kwargs={'pk': user.id})
+    with django_assert_max_num_queries(2) as queries:
+        response = auth_client.get(ids_url, {'page_size': 5})
+    assert not any('recipe_recipe' in query['sql'] for query in queries.captured_queries)
+    assert response.data['count'] == 12
+    assert response.data['results'] == [recipe.id for recipe in recipes[::-1][:5]]
+    assert auth_client.get(response.data['next']).data['results'] == [recipe.id for recipe in recipes[::-1][5:10]]
+
+    # Replacing the set through the profile keeps the counters in step
+    auth_client.patch(reverse('users:user-profile'), {'bookmarks': [recipes[0].id]}, format='json')
+    assert auth_client.get(reverse('users:user-profile')).data['bookmark_count'] == 1
+    assert [r.bookmark_count for r in Recipe.objects.order_by('pk')[:2]] == [1, 0]
 
 # GET /api/user/profile/avatar/
 @pytest.mark.django_db
@@ -217,11 +321,31 @@ def test_update_user_avatar(auth_client):
     response = auth_client.put(url, data, format='multipart')
     assert response.status_code == status.HTTP_200_OK
     assert 'avatar' in response.data
-    avatar_path = response.data['avatar'].split('/')[-1]
-    full_file_path = f'avatar/{avatar_path}'
+    full_file_path = response.data['avatar'].split('/media/', 1)[-1]
     if default_storage.exists(full_file_path):
         default_storage.delete(full_file_path)
 
+# PUT /api/user/profile/avatar/ - Avatar renditions
+@pytest.mark.django_db
+def test_user_avatar_renditions(auth_client, user, settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    url = reverse('users:user-avatar')
+    assert auth_client.get(url).data['avatar_renditions'] is None
+
+    img_byte_arr = io.BytesIO()
+    Image.new('RGB', (100, 100), color='red').save(img_byte_arr, format='PNG')
+    avatar = SimpleUploadedFile("avatar.png", img_byte_arr.getvalue(), content_type="image/png")
+    response = auth_client.put(url, {'avatar': avatar}, format='multipart')
+    assert response.data['avatar_renditions']['thumbnail']['jpeg'] == response.data['avatar']
+
+    generate_image_renditions('users.Profile', user.profile.pk, 'avatar')
+    user.profile.refresh_from_db()
+    renditions = auth_client.get(url).data['avatar_renditions']
+    # Small images are re-encoded, never upscaled
+    assert renditions['full']['jpeg'].endswith('.jpeg')
+    with Image.open(tmp_path / user.profile.avatar_renditions['full']['webp']) as rendition:
+        assert rendition.size == (100, 100)
+
 # PATCH /api/user/profile/avatar/
 @pytest.mark.django_db
 def test_partial_update_user_avatar(auth_client):
@@ -236,8 +360,7 @@ def test_partial_update_user_avatar(auth_client):
     response = auth_client.patch(url, data, format='multipart')
     assert response.status_code == status.HTTP_200_OK
     assert 'avatar' in response.data
-    avatar_path = response.data['avatar'].split('/')[-1]
-    full_file_path = f'avatar/{avatar_path}'
+    full_file_path = response.data['avatar'].split('/media/', 1)[-1]
     if default_storage.exists(full_file_path):
         default_storage.delete(full_file_path)
 
@@ -264,3 +387,134 @@ def test_token_refresh(api_client, user):
     response = api_client.post(refresh_url, {'refresh': refresh_token})
     assert response.status_code == status.HTTP_200_OK
     assert 'access' in response.data
+
+# GET /api/user/profile/ - Cached JWT user
+@pytest.mark.django_db
+def test_cached_jwt_user(api_client, user):
+    login_response = api_client.post(reverse('users:login-user'), {'email': user.email, 'password': 'testpassword'})
+    api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {login_response.data['tokens']['access']}")
+    url = reverse('users:user-profile')
+
+    def user_queries():
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        return [query['sql'] for query in queries if 'FROM "users_customuser"' in query['sql']
+                or 'FROM "users_profile" WHERE' in query['sql']]
+
+    # The user and profile are read with one query, then from the cache
+    assert len(user_queries()) == 1
+    assert user_queries() == []
+
+    # Profile saves and password changes drop the cached user
+    response = api_client.patch(url, {'bio': 'updated bio'})
+    assert response.status_code == status.HTTP_200_OK
+    assert len(user_queries()) == 1
+    assert api_client.get(url).data['bio'] == 'updated bio'
+    response = api_client.put(reverse('users:change-password'), {'old_password': 'testpassword', 'new_password': 'newpassword123'})
+    assert response.status_code == status.HTTP_200_OK
+    assert len(user_queries()) == 1
+
+    # Inactive users are refused once the cached copy is dropped
+    user.refresh_from_db()
+    user.is_active = False
+    user.save()
+    assert api_client.get(url).status_code == status.HTTP_401_UNAUTHORIZED
+
+# POST /api/user/token/refresh/ - Blacklist filter
+@pytest.mark.django_db
+def test_token_refresh_blacklist_filter(api_client, user, settings, monkeypatch):
+    settings.BLACKLIST_FILTER = True
+    # A filter per process would miss the tokens other processes blacklist
+    settings.BLACKLIST_FILTER_URL = ''
+    with pytest.raises(ImproperlyConfigured):
+        blacklist.get_blacklist_filter()
+    settings.BLACKLIST_FILTER_URL = blacklist.MEMORY_URL
+    monkeypatch.setattr(blacklist, '_filter', blacklist.InMemoryBlacklistFilter())
+    refresh_url = reverse('users:token-refresh')
+    first = api_client.post(reverse('users:login-user'), {'email': user.email, 'password': 'testpassword'}).data['tokens']['refresh']
+
+    def refresh(token):
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.post(refresh_url, {'refresh': token})
+        checks = [query for query in queries if 'FROM "token_blacklist_blacklistedtoken" INNER JOIN' in query['sql']
+                  and '."jti" =' in query['sql']]
+        return response, len(checks)
+
+    # Until the beat builds the filter every token is checked in the table,
+    # then the table is skipped
+    response, checks = refresh(first)
+    assert response.status_code == status.HTTP_200_OK
+    assert checks == 1
+    assert build_token_blacklist_filter()
+    assert not build_token_blacklist_filter()
+    response, checks = refresh(response.data['refresh'])
+    assert response.status_code == status.HTTP_200_OK
+    assert checks == 0
+
+    # Rotated tokens are in the filter and refused by the table
+    response, checks = refresh(first)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert checks == 1
+
+# POST /api/user/login/ - Saturated hashing pool
+@pytest.mark.django_db
+@pytest.mark.urls('config.asgi_urls')
+def test_login_hashing_pool(api_client, user, monkeypatch):
+    pool = hashing.BoundedHashingPool(workers=1, queue_size=0)
+    monkeypatch.setattr(hashing, '_pool', pool)
+    url = reverse('users:login-user')
+    credentials = {'email': user.email, 'password': 'testpassword'}
+
+    # Every slot busy: refused at once instead of queued
+    pool.slots.acquire()
+    response = api_client.post(url, credentials)
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response['Retry-After'] == '1'
+    response = api_client.post(reverse('users:create-user'), {'username': 'newuser', 'email': 'newuser@example.com', 'password': 'newpassword'})
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert not CustomUser.objects.filter(email='newuser@example.com').exists()
+
+    pool.slots.release()
+    response = api_client.post(url, credentials, format='json')
+    assert response.status_code == status.HTTP_200_OK
+    assert api_client.get(url).status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+    # DRF view: metadata and the browsable API
+    assert api_client.options(url).data['name'] == 'Async User Login Api'
+    assert api_client.get(url, HTTP_ACCEPT='text/html').status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+
+    # Registration stores the hash made on the pool
+    response = api_client.post(reverse('users:create-user'), {'username': 'newuser', 'email': 'newuser@example.com', 'password': 'newpassword'})
+    assert response.status_code == status.HTTP_201_CREATED
+    assert CustomUser.objects.get(email='newuser@example.com').check_password('newpassword')
+    assert api_client.post(url, {'email': 'newuser@example.com', 'password': 'newpassword'}).status_code == status.HTTP_200_OK
+
+# POST /api/user/login/ - Configured authentication backends
+@pytest.mark.django_db
+@pytest.mark.urls('config.asgi_urls')
+def test_login_authentication_backends(api_client, user, settings):
+    url = reverse('users:login-user')
+    failures = []
+
+    def record(sender, credentials, request, **kwargs):
+        failures.append(credentials)
+    user_login_failed.connect(record)
+    try:
+        response = api_client.post(url, {'email': user.email, 'password': 'wrongpassword'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['non_field_errors'] == ['Incorrect Credentials']
+        assert failures == [{'email': user.email, 'password': '********************'}]
+
+        # Backends without `aauthenticate` are called as they are
+        settings.AUTHENTICATION_BACKENDS = ['django.contrib.auth.backends.ModelBackend']
+        response = api_client.post(url, {'email': user.email, 'password': 'testpassword'})
+        assert response.status_code == status.HTTP_200_OK
+
+        user.is_active = False
+        user.save()
+        settings.AUTHENTICATION_BACKENDS = ['users.backends.HashingPoolBackend']
+        response = api_client.post(url, {'email': user.email, 'password': 'testpassword'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert len(failures) == 2
+    finally:
+        user_login_failed.disconnect(record)
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+USER_KEY = 'user:auth:{pk}'
+
+
+def invalidate_user(pk):
+    """
+    Drops the cached user, so the next request reads it again.
+    """
+    cache.delete(USER_KEY.format(pk=pk))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication reading the user, with its profile, from the cache.
+
+    A miss loads both with one query and keeps them for
+    `AUTH_USER_CACHE_TIMEOUT` seconds. Saving or deleting a user or profile
+    (password changes included) drops the entry, see users.signals.
+    """
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        key = USER_KEY.format(pk=user_id)
+        user = cache.get(key)
+        if user is None:
+            try:
+                user = self.user_model.objects.select_related('profile').get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        return user
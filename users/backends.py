@@ -0,0 +1,29 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from .hashing import check_password, make_password
+
+UserModel = get_user_model()
+
+
+class HashingPoolBackend(ModelBackend):
+    """
+    ModelBackend that async views can also authenticate with
+    (`users.hashing.authenticate`): the user is read on Django's sync thread
+    and the password checked on the bounded hashing pool, not on the event
+    loop. Sync callers (admin, browsable API login) get ModelBackend as is.
+    """
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = await sync_to_async(UserModel._default_manager.get_by_natural_key)(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway, so unknown emails take as long as wrong passwords
+            await make_password(password)
+        else:
+            if await check_password(user, password) and self.user_can_authenticate(user):
+                return user
@@ -0,0 +1,40 @@
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from recipe.cache import invalidate_recipe
+from recipe.models import Recipe, actual_bookmark_count
+from .models import Bookmark
+
+# Largest number of recipe ids accepted in one request
+MAX_BATCH_BOOKMARKS = 500
+
+
+def set_bookmarks(profile, recipe_ids, bookmarked):
+    """
+    Bookmarks (or un-bookmarks) the given recipes for a profile with one bulk
+    insert (or delete) on the through table. `bookmark_count` of the changed
+    recipes is recounted in a single UPDATE, so concurrent calls never drift.
+
+    Returns `{recipe_id: changed}` for every recipe that exists.
+    """
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    if not recipe_ids:
+        return {}
+    # Existence and current state of every recipe in one query
+    current = dict(Recipe.objects.filter(pk__in=recipe_ids).annotate(
+        bookmarked=Exists(Bookmark.objects.filter(profile=profile, recipe=OuterRef('pk')))
+    ).order_by().values_list('pk', 'bookmarked'))
+    changed = {pk for pk, state in current.items() if state != bookmarked}
+    if changed:
+        with transaction.atomic():
+            if bookmarked:
+                Bookmark.objects.bulk_create(
+                    [Bookmark(profile=profile, recipe_id=pk) for pk in changed], ignore_conflicts=True)
+            else:
+                Bookmark.objects.filter(profile=profile, recipe_id__in=changed).delete()
+            Recipe.objects.filter(pk__in=changed).update(
+                bookmark_count=actual_bookmark_count(), updated_at=timezone.now())
+        for pk in changed:
+            invalidate_recipe(pk)
+    return {pk: pk in changed for pk in current}
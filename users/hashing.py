@@ -0,0 +1,112 @@
+import asyncio
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import hashers
+from django.core.exceptions import PermissionDenied
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class HashingPoolSaturated(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many sign-ins in progress, please retry shortly.'
+    default_code = 'hashing_pool_saturated'
+    # Sent as Retry-After by DRF's exception handler
+    wait = 1
+
+
+class BoundedHashingPool:
+    """
+    Thread pool for password hashing with a cap on the calls it holds,
+    running or queued. Calls beyond the cap are refused at once instead of
+    waiting behind a login storm. PBKDF2 releases the GIL, so the threads
+    hash in parallel without slowing the event loop.
+    """
+    def __init__(self, workers, queue_size):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+
+    async def run(self, func, *args):
+        if not self.slots.acquire(blocking=False):
+            raise HashingPoolSaturated()
+        try:
+            future = self.executor.submit(func, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda f: self.slots.release())
+        return await asyncio.wrap_future(future)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    """
+    Returns the process-wide pool sized by `PASSWORD_HASHING_WORKERS` and
+    `PASSWORD_HASHING_QUEUE`.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BoundedHashingPool(settings.PASSWORD_HASHING_WORKERS, settings.PASSWORD_HASHING_QUEUE)
+        return _pool
+
+
+def must_update(encoded):
+    preferred = hashers.get_hasher('default')
+    return hashers.identify_hasher(encoded).algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+async def make_password(password):
+    return await get_hashing_pool().run(hashers.make_password, password)
+
+
+async def check_password(user, password):
+    """
+    `user.check_password` with the check on the pool. An outdated hash is
+    upgraded and saved, as `set_password` would.
+    """
+    if not await get_hashing_pool().run(hashers.check_password, password, user.password):
+        return False
+    if must_update(user.password):
+        user.password = await make_password(password)
+        await sync_to_async(user.save)(update_fields=['password'])
+    return True
+
+
+async def authenticate(request=None, **credentials):
+    """
+    Async `django.contrib.auth.authenticate`: tries the configured
+    AUTHENTICATION_BACKENDS in order, awaiting `aauthenticate` where a
+    backend has one (users.backends) and running `authenticate` on Django's
+    sync thread otherwise. Failures send `user_login_failed`.
+    """
+    for backend, backend_path in auth._get_backends(return_tuples=True):
+        method = getattr(backend, 'aauthenticate', None)
+        try:
+            inspect.signature(method or backend.authenticate).bind(request, **credentials)
+        except TypeError:
+            # This backend doesn't accept these credentials as arguments. Try the next one.
+            continue
+        try:
+            if method is not None:
+                user = await method(request, **credentials)
+            else:
+                user = await sync_to_async(backend.authenticate)(request, **credentials)
+        except PermissionDenied:
+            # This backend says to stop in our tracks - this user should not be allowed in at all.
+            break
+        if user is None:
+            continue
+        user.backend = backend_path
+        return user
+
+    await sync_to_async(auth.user_login_failed.send)(
+        sender=auth.__name__, credentials=auth._clean_credentials(credentials), request=request)
@@ -7,12 +7,19 @@ class CustomUserManager(BaseUserManager):
     Custom user model manager where email is the unique identifier
     for authentication instead of usernames.
     """
-    def create_user(self, email, password, **extra_fields):
+    def create_user(self, email, password, password_hash=None, **extra_fields):
+        """
+        `password_hash` is an already hashed password, used instead of
+        hashing `password` here.
+        """
         if not email:
             raise ValueError(_('Users must have an email address'))
         email = self.normalize_email(email)
         user = self.model(email=email, **extra_fields)
-        user.set_password(password)
+        if password_hash is None:
+            user.set_password(password)
+        else:
+            user.password = password_hash
         user.save()
         return user
 
@@ -0,0 +1,48 @@
+# Generated by Django 3.2.9 on 2026-10-18 11:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0010_recipetrending'),
+        ('users', '0011_alter_customuser_email'),
+    ]
+
+    operations = [
+        # The auto-created through table becomes the Bookmark model as is
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='Bookmark',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.profile')),
+                        ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipe.recipe')),
+                    ],
+                    options={
+                        'db_table': 'users_profile_bookmarks',
+                        'unique_together': {('profile', 'recipe')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='profile',
+                    name='bookmarks',
+                    field=models.ManyToManyField(related_name='bookmarked_by', through='users.Bookmark', to='recipe.Recipe'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='bookmark',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='bookmark',
+            index=models.Index(fields=['profile', '-created', '-recipe'], name='bookmark_profile_created_idx'),
+        ),
+    ]
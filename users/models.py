@@ -21,9 +21,33 @@ class CustomUser(AbstractUser):
 
 class Profile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    bookmarks = models.ManyToManyField(Recipe, related_name='bookmarked_by')
+    bookmarks = models.ManyToManyField(Recipe, related_name='bookmarked_by', through='Bookmark')
+    # Stored by content hash (recipe.storage), which ignores upload_to
     avatar = models.ImageField(upload_to='avatar', blank=True)
+    # Names of the resized copies of `avatar`, see recipe.renditions
+    avatar_renditions = models.JSONField(default=dict, blank=True, editable=False)
     bio = models.CharField(max_length=200, blank=True)
 
     def __str__(self):
         return self.user.username
+
+
+class Bookmark(models.Model):
+    """
+    Through model of `Profile.bookmarks`, recording when a recipe was bookmarked
+    """
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE)
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # The table of the former auto-created through model
+        db_table = 'users_profile_bookmarks'
+        unique_together = ('profile', 'recipe')
+        indexes = [
+            # Backs the newest-first keyset pagination of a profile's bookmarks
+            models.Index(fields=['profile', '-created', '-recipe'], name='bookmark_profile_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.profile} - {self.recipe}'
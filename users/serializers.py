@@ -1,8 +1,19 @@
 from rest_framework import serializers
-from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.db import models
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 
-from .models import CustomUser, Profile
+from recipe.models import Recipe
+from recipe.renditions import rendition_urls
+from recipe.serializers import image_url_builder
+from recipe.uploads import HeaderValidatedImageField
+from .bookmarks import set_bookmarks
+from .models import Bookmark, CustomUser, Profile
+from .tokens import RefreshToken
+
+# Bookmark ids included in the profile, newest first
+RECENT_BOOKMARKS = 10
 
 
 class CustomUserSerializer(serializers.ModelSerializer):
@@ -24,39 +35,68 @@ class UserRegisterationSerializer(serializers.ModelSerializer):
         extra_kwargs = {'password': {'write_only': True}}
 
     def create(self, validated_data):
+        # `password_hash` is passed to save() by views hashing off the request thread
         return CustomUser.objects.create_user(**validated_data)
 
 
 class UserLoginSerializer(serializers.Serializer):
     """
-    Serializer class to authenticate users with email and password.
+    Serializer class to validate login requests. The credentials are
+    checked by `UserLoginAPIView` with the configured backends.
     """
     email = serializers.CharField()
     password = serializers.CharField(write_only=True)
 
-    def validate(self, data):
-        user = authenticate(**data)
-        if user and user.is_active:
-            return user
-        raise serializers.ValidationError('Incorrect Credentials')
-
 
 class ProfileSerializer(CustomUserSerializer):
     """
-    Serializer class to serialize the user Profile model
+    Serializer class to serialize the user Profile model.
+    Bookmarks are read as a count plus the most recent ids, the full list is
+    served page by page by `UserBookmarkIdsAPIView`. Writing `bookmarks`
+    replaces the whole set.
     """
+    bookmarks = serializers.PrimaryKeyRelatedField(
+        many=True, queryset=Recipe.objects.all(), required=False, write_only=True)
+    bookmark_count = serializers.SerializerMethodField()
+    recent_bookmarks = serializers.SerializerMethodField()
+
     class Meta:
         model = Profile
-        fields = ('bookmarks', 'bio')
+        fields = ('bookmarks', 'bookmark_count', 'recent_bookmarks', 'bio')
+
+    def get_bookmark_count(self, obj):
+        return Bookmark.objects.filter(profile=obj).count()
+
+    def get_recent_bookmarks(self, obj):
+        return list(Bookmark.objects.filter(profile=obj).order_by('-created', '-recipe_id')
+                    .values_list('recipe_id', flat=True)[:RECENT_BOOKMARKS])
+
+    def update(self, instance, validated_data):
+        # Applied as additions and removals so the recipe counters follow
+        if 'bookmarks' in validated_data:
+            wanted = {recipe.pk for recipe in validated_data.pop('bookmarks')}
+            current = set(Bookmark.objects.filter(profile=instance).values_list('recipe_id', flat=True))
+            set_bookmarks(instance, wanted - current, True)
+            set_bookmarks(instance, current - wanted, False)
+        return super().update(instance, validated_data)
 
 
 class ProfileAvatarSerializer(serializers.ModelSerializer):
     """
     Serializer class to serialize the avatar
     """
+    avatar_renditions = serializers.SerializerMethodField()
+    # Uploads are validated from the image header, see recipe.uploads
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping, models.ImageField: HeaderValidatedImageField}
+
     class Meta:
         model = Profile
-        fields = ('avatar',)
+        fields = ('avatar', 'avatar_renditions')
+
+    def get_avatar_renditions(self, obj):
+        url = image_url_builder(obj.avatar.storage, self.context.get('request'))
+        return rendition_urls(obj.avatar_renditions, obj.avatar.name, url)
 
 
 class PasswordChangeSerializer(serializers.Serializer):
@@ -80,3 +120,23 @@ class PasswordChangeSerializer(serializers.Serializer):
         instance.set_password(validated_data['new_password'])
         instance.save()
         return instance
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    """
+    Serializer class for rotating refresh tokens, checking the blacklist
+    through the Bloom filter of users.blacklist
+    """
+    def validate(self, attrs):
+        refresh = RefreshToken(attrs['refresh'])
+        data = {'access': str(refresh.access_token)}
+
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            if jwt_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+
+        return data
@@ -1,4 +1,5 @@
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.contrib.auth import get_user_model
 from django.dispatch import receiver
 from django.core.mail import EmailMultiAlternatives
@@ -6,7 +7,12 @@ from django.template.loader import render_to_string
 from django.urls import reverse
 
 from django_rest_passwordreset.signals import reset_password_token_created
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
 
+from recipe.renditions import queue_renditions
+from recipe.storage import release_files, release_replaced_file
+from .authentication import invalidate_user
+from .blacklist import get_blacklist_filter
 from .models import Profile
 
 
@@ -24,6 +30,44 @@ def save_profile(sender, instance, **kwargs):
     instance.profile.save()
 
 
+# Drop the user cached by JWT authentication, see users.authentication
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+# Add newly blacklisted tokens to the filter, before the row commits so no
+# refresh can miss them, see users.blacklist
+@receiver(post_save, sender=BlacklistedToken)
+def add_to_blacklist_filter(sender, instance, created, **kwargs):
+    if created and settings.BLACKLIST_FILTER:
+        get_blacklist_filter().add(instance.token.jti)
+
+
+# Resize new avatars in the background
+@receiver(post_save, sender=Profile)
+def queue_avatar_renditions(sender, instance, **kwargs):
+    queue_renditions(instance, 'avatar')
+
+
+# Release the stored files a profile no longer uses
+@receiver(pre_save, sender=Profile)
+def release_replaced_avatar(sender, instance, **kwargs):
+    release_replaced_file(sender, instance, 'avatar')
+
+
+@receiver(post_delete, sender=Profile)
+def release_avatar(sender, instance, **kwargs):
+    release_files(instance, 'avatar')
+
+
 # Password reset
 @receiver(reset_password_token_created)
 def password_reset_token_created(sender, instance, reset_password_token, *args, **kwargs):
@@ -0,0 +1,16 @@
+from django.conf import settings
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.settings import api_settings
+
+from .blacklist import may_be_blacklisted
+
+
+class RefreshToken(tokens.RefreshToken):
+    """
+    Refresh token whose blacklist check only queries the blacklist table
+    when the Bloom filter (users.blacklist) may contain the token.
+    """
+    def check_blacklist(self):
+        if settings.BLACKLIST_FILTER and not may_be_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            return
+        super().check_blacklist()
@@ -1,7 +1,7 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView
 
-from users import views
+from users import serializers, views
 
 app_name = 'users'
 
@@ -9,7 +9,8 @@ urlpatterns = [
     path('register/', views.UserRegisterationAPIView.as_view(),
          name="create-user"),
     path('login/', views.UserLoginAPIView.as_view(), name="login-user"),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    path('token/refresh/', TokenRefreshView.as_view(serializer_class=serializers.TokenRefreshSerializer),
+         name='token-refresh'),
     path('logout/', views.UserLogoutAPIView.as_view(), name='logout-user'),
     path('', views.UserAPIView.as_view(), name='user-info'),
     path('profile/', views.UserProfileAPIView.as_view(),
@@ -18,6 +19,17 @@ urlpatterns = [
          name='user-avatar'),
     path('profile/<int:pk>/bookmarks/', views.UserBookmarkAPIView.as_view(),
          name='user-bookmark'),
+    path('profile/<int:pk>/bookmarks/ids/', views.UserBookmarkIdsAPIView.as_view(),
+         name='user-bookmark-ids'),
     path('password/change/', views.PasswordChangeAPIView.as_view(),
          name='change-password'),
 ]
+
+# Served by config.asgi only (config.asgi_urls): login and registration
+# await the password hashing pool, see users.views
+async_urlpatterns = [
+    path('register/', views.AsyncUserRegisterationAPIView.as_view(),
+         name="create-user"),
+    path('login/', views.AsyncUserLoginAPIView.as_view(), name="login-user"),
+    *(pattern for pattern in urlpatterns if pattern.name not in ('create-user', 'login-user')),
+]
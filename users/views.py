@@ -1,17 +1,34 @@
+from asgiref.sync import sync_to_async
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.generics import GenericAPIView, RetrieveUpdateAPIView, ListCreateAPIView, UpdateAPIView
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.settings import api_settings
+from rest_framework.generics import GenericAPIView, RetrieveUpdateAPIView, ListAPIView, ListCreateAPIView, UpdateAPIView
+from django.contrib import auth
 from django.contrib.auth import get_user_model
-from django.shortcuts import get_object_or_404
+from django.db.models import F
 
+from config.views import AsyncGenericAPIView
 from recipe.models import Recipe
-from recipe.serializers import RecipeSerializer
+from recipe.pagination import BookmarkCursorPagination, BookmarkIdsPagination, OptInCursorPaginationMixin
+from recipe.serializers import RecipeSerializer, requested_fields
 from . import serializers
+from .bookmarks import MAX_BATCH_BOOKMARKS, set_bookmarks
+from .hashing import authenticate, make_password
+from .models import Bookmark
+from .tokens import RefreshToken
 
 User = get_user_model()
 
+def tokens_for(user):
+    token = RefreshToken.for_user(user)
+    return {
+        'refresh': str(token),
+        'access': str(token.access_token)
+    }
+
+
 class UserRegisterationAPIView(GenericAPIView):
     """
     An endpoint for clients to create a new user.
@@ -23,12 +40,8 @@ class UserRegisterationAPIView(GenericAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
-        token = RefreshToken.for_user(user)
         data = serializer.data
-        data['tokens'] = {
-            'refresh': str(token),
-            'access': str(token.access_token)
-        }
+        data['tokens'] = tokens_for(user)
         return Response(data, status=status.HTTP_201_CREATED)
 
 
@@ -42,13 +55,49 @@ class UserLoginAPIView(GenericAPIView):
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = serializer.validated_data
+        user = auth.authenticate(request, **serializer.validated_data)
+        if user is None:
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: ['Incorrect Credentials']})
+        response_data = serializers.CustomUserSerializer(user).data
+        response_data['tokens'] = tokens_for(user)
+        return Response(response_data, status=status.HTTP_200_OK)
+
+
+# The async views below are served by config.asgi only (config.asgi_urls).
+# They hash on the bounded pool of users.hashing, so a login storm gets
+# 503s instead of holding the event loop. Sync workers hash inline: a
+# login holds its worker either way, so WSGI keeps the views above.
+
+class AsyncUserRegisterationAPIView(AsyncGenericAPIView, UserRegisterationAPIView):
+    """
+    An endpoint for clients to create a new user.
+    The password is hashed on the bounded pool of users.hashing, a full pool
+    answers 503.
+    """
+    async def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        password_hash = await make_password(serializer.validated_data['password'])
+        user = await sync_to_async(serializer.save)(password_hash=password_hash)
+        data = serializer.data
+        data['tokens'] = await sync_to_async(tokens_for)(user)
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class AsyncUserLoginAPIView(AsyncGenericAPIView, UserLoginAPIView):
+    """
+    An endpoint to authenticate existing users using their email and password.
+    The password is checked on the bounded pool of users.hashing, a full pool
+    answers 503.
+    """
+    async def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = await authenticate(request, **serializer.validated_data)
+        if user is None:
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: ['Incorrect Credentials']})
         response_data = serializers.CustomUserSerializer(user).data
-        token = RefreshToken.for_user(user)
-        response_data['tokens'] = {
-            'refresh': str(token),
-            'access': str(token.access_token)
-        }
+        response_data['tokens'] = await sync_to_async(tokens_for)(user)
         return Response(response_data, status=status.HTTP_200_OK)
 
 
@@ -103,34 +152,74 @@ class UserAvatarAPIView(RetrieveUpdateAPIView):
         return self.request.user.profile
 
 
-class UserBookmarkAPIView(ListCreateAPIView):
+class UserBookmarkAPIView(OptInCursorPaginationMixin, ListCreateAPIView):
     """
     Get, create, and delete favorite recipe bookmarks.
+    The list is ordered by bookmark time, newest first, and supports keyset
+    pagination with `?pagination=cursor`. Recipes are added or removed with
+    `{"id": ...}` or in bulk with `{"ids": [...]}`.
     """
     permission_classes = (IsAuthenticated,)
     serializer_class = RecipeSerializer
+    cursor_pagination_class = BookmarkCursorPagination
 
     def get_queryset(self):
-        return self.request.user.profile.bookmarks.all()
+        # Only the relations and columns of the requested fields are loaded,
+        # author and category joined, so a page costs a fixed number of queries
+        fields = requested_fields(self.request, self.get_serializer_class().Meta.fields)
+        return Recipe.objects.for_fields(fields).filter(bookmark__profile__user=self.request.user).annotate(
+            bookmarked_at=F('bookmark__created')).order_by('-bookmarked_at', '-id')
 
     def post(self, request, *args, **kwargs):
-        recipe_id = request.data.get('id')
-        if not recipe_id:
-            return Response({"detail": "Recipe ID is required"}, status=status.HTTP_400_BAD_REQUEST)
-        
-        recipe = get_object_or_404(Recipe, id=recipe_id)
-        user_profile = self.request.user.profile
-        user_profile.bookmarks.add(recipe)
-        return Response(status=status.HTTP_200_OK)
+        return self.set_bookmarks(request, bookmarked=True)
 
     def delete(self, request, *args, **kwargs):
-        recipe_id = request.data.get('id')
-        if not recipe_id:
-            return Response({"detail": "Recipe ID is required"}, status=status.HTTP_400_BAD_REQUEST)
-        recipe = get_object_or_404(Recipe, id=recipe_id)
-        user_profile = self.request.user.profile
-        user_profile.bookmarks.remove(recipe)
-        return Response(status=status.HTTP_200_OK)
+        return self.set_bookmarks(request, bookmarked=False)
+
+    # One bulk insert or delete on the through table, see users.bookmarks
+    def set_bookmarks(self, request, bookmarked):
+        if 'ids' in request.data:
+            ids = request.data.getlist('ids') if hasattr(request.data, 'getlist') else request.data['ids']
+            if not isinstance(ids, list) or not ids:
+                return Response({"detail": "A non-empty list of recipe ids is required"}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            ids = [request.data.get('id')]
+            if not ids[0]:
+                return Response({"detail": "Recipe ID is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > MAX_BATCH_BOOKMARKS:
+            return Response({"detail": f"At most {MAX_BATCH_BOOKMARKS} recipe ids per request"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            ids = [int(pk) for pk in ids]
+        except (TypeError, ValueError):
+            return Response({"detail": "Recipe ids must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = set_bookmarks(request.user.profile, ids, bookmarked)
+        if 'ids' not in request.data:
+            if not result:
+                return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+            return Response(status=status.HTTP_200_OK)
+        return Response({
+            'changed': [pk for pk in ids if result.get(pk)],
+            'unchanged': [pk for pk in ids if result.get(pk) is False],
+            'not_found': [pk for pk in ids if pk not in result],
+        }, status=status.HTTP_200_OK)
+
+
+class UserBookmarkIdsAPIView(ListAPIView):
+    """
+    Ids of all bookmarked recipes, newest bookmark first, read from the
+    through table without loading recipes.
+    """
+    permission_classes = (IsAuthenticated,)
+    pagination_class = BookmarkIdsPagination
+
+    def get_queryset(self):
+        return Bookmark.objects.filter(profile__user=self.request.user).order_by(
+            '-created', '-recipe_id').values_list('recipe_id', flat=True)
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        return self.get_paginated_response(list(page))
 
 
 class PasswordChangeAPIView(UpdateAPIView):